@@ -0,0 +1,126 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TextIO
+import argparse
+import json
+import os
+import sys
+import time
+from data_classes import PuzzleContradiction
+from puzzle import Puzzle
+from puzzle_files import PuzzleClues, iter_puzzle_clues, puzzle_loaders
+from solver import solve_puzzle
+from square import Square
+
+
+# Solves a pile of puzzle files across a pool of worker processes, headless
+# Writes one JSON line per puzzle as soon as it's done, so results stream out (in whatever order they finish) rather than all at the end
+#
+#   python -m batch puzzles/ more_puzzles/odd_one.json --workers 8 > results.jsonl
+#
+# Files can hold more than one puzzle. They're read here, a puzzle at a time, and only the clues are sent to the workers.
+# Each line has the file's path and the puzzle's index in it, a status, and for puzzles that got as far as solving, the grid and the solver's stats
+#   solved         Every square is known
+#   stuck          The line algorithms (and probing, if allowed) ran out of things to deduce
+#   deadline       Ran out of time, with --time-limit. The grid is as far as it got.
+#   contradiction  The clues can't all be satisfied
+#   error          The file couldn't be loaded, see 'error' for why. The index is where in the file it went wrong.
+
+grid_chars = {Square.FILLED: '#', Square.KNOWN_BLANK: '.', Square.UNKNOWN: '?'} # Plain ASCII, so the JSON stays readable
+
+
+def find_puzzle_files(paths: list[str]) -> list[str]:
+    puzzle_paths: list[str] = []
+    for path in paths:
+        if not os.path.isdir(path):
+            puzzle_paths.append(path)
+            continue
+        # Directories are searched all the way down, but only for files we know how to load
+        for directory, directory_names, file_names in os.walk(path):
+            directory_names.sort()
+            for file_name in sorted(file_names):
+                if os.path.splitext(file_name)[1].lower() in puzzle_loaders:
+                    puzzle_paths.append(os.path.join(directory, file_name))
+    return puzzle_paths
+
+
+def get_grid(puzzle: Puzzle) -> list[str]:
+    return [''.join(grid_chars[square] for square in puzzle.get_row_squares(row_index)) for row_index in range(puzzle.num_rows)]
+
+
+# Runs in a worker process. Everything that can go wrong ends up in the result rather than taking the worker down.
+def solve_puzzle_clues(path: str, index: int, puzzle_clues: PuzzleClues, max_probes: int, adaptive: bool, time_limit: float | None = None) -> dict:
+    try:
+        row_clues, column_clues = puzzle_clues
+        puzzle = Puzzle(len(row_clues), len(column_clues), row_clues, column_clues)
+        result = solve_puzzle(puzzle, max_probes=max_probes, adaptive=adaptive, time_limit=time_limit)
+    except PuzzleContradiction as contradiction:
+        return {'path': path, 'index': index, 'status': 'contradiction', 'error': str(contradiction)}
+    except Exception as error:
+        return {'path': path, 'index': index, 'status': 'error', 'error': str(error)}
+
+    return {
+        'path': path,
+        'index': index,
+        'status': result.status,
+        'size': [puzzle.num_rows, puzzle.num_columns],
+        'grid': get_grid(puzzle),
+        'rounds': result.rounds,
+        'line_evaluations': result.line_evaluations,
+        'probes': result.probes,
+        'wall_time': result.wall_time,
+    }
+
+
+# Returns how many puzzles ended up with each status
+def run_batch(puzzle_paths: list[str], output: TextIO, max_workers: int, max_probes: int = 0, adaptive: bool = False, time_limit: float | None = None) -> dict[str, int]:
+    status_counts: dict[str, int] = {}
+
+    def write_result(result: dict) -> None:
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+        status_counts[result['status']] = status_counts.get(result['status'], 0) + 1
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for path in puzzle_paths:
+            index = 0
+            try:
+                for puzzle_clues in iter_puzzle_clues(path):
+                    futures.append(executor.submit(solve_puzzle_clues, path, index, puzzle_clues, max_probes, adaptive, time_limit))
+                    index += 1
+            except Exception as error:
+                write_result({'path': path, 'index': index, 'status': 'error', 'error': str(error)})
+
+        for future in as_completed(futures):
+            write_result(future.result())
+
+    return status_counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Solve many puzzle files, writing a JSON line for each as it finishes')
+    parser.add_argument('paths', nargs='+', help='Puzzle files, or directories to search for them')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Puzzles to solve at once, one per CPU by default')
+    parser.add_argument('--max-probes', type=int, default=0, help='Guesses to try on each puzzle if the line algorithms get stuck. None by default, like main.py')
+    parser.add_argument('--adaptive', action='store_true', help='Reorder the line algorithms by how much they find for the time they take')
+    parser.add_argument('--time-limit', type=float, help='Seconds to give each puzzle')
+    parser.add_argument('--output', help='Where to write the results, instead of stdout')
+    args = parser.parse_args()
+
+    puzzle_paths = find_puzzle_files(args.paths)
+    start_time = time.perf_counter()
+
+    if args.output is None:
+        status_counts = run_batch(puzzle_paths, sys.stdout, args.workers, args.max_probes, args.adaptive, args.time_limit)
+    else:
+        with open(args.output, 'w') as output_file:
+            status_counts = run_batch(puzzle_paths, output_file, args.workers, args.max_probes, args.adaptive, args.time_limit)
+
+    # The summary goes to stderr, so stdout is nothing but JSON lines
+    summary = ', '.join(f'{count} {status}' for status, count in sorted(status_counts.items()))
+    print(f'{len(puzzle_paths)} files in {time.perf_counter() - start_time:.2f}s: {summary or "nothing to do"}', file=sys.stderr)
+    return 0 if status_counts.get('error', 0) == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
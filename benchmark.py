@@ -0,0 +1,134 @@
+from dataclasses import dataclass
+import argparse
+import json
+import sys
+from example_hanjies import house, poolside, tabled
+from generator import generate_random_puzzle
+from puzzle import Puzzle
+from solver import solve_puzzle
+
+
+# Runs a corpus of puzzles through the solver without any display, and records how it went
+# Results are written to a JSON file and compared with a stored baseline, so we notice when a change makes things slower
+# Wall times depend on the machine, so refresh the baseline with --update-baseline before comparing your own changes
+#
+#   python -m benchmark                     Run the corpus and compare with benchmark_baseline.json
+#   python -m benchmark --update-baseline   Run the corpus and store the results as the new baseline
+
+default_results_path = 'benchmark_results.json'
+default_baseline_path = 'benchmark_baseline.json'
+default_time_tolerance = 0.25 # A puzzle counts as slower once it takes 25% longer than the baseline...
+min_time_difference = 0.005   # ...and at least 5ms longer, since tiny puzzles are mostly timer noise
+
+
+@dataclass
+class BenchmarkPuzzle:
+    name: str
+    difficulty: str # 'line-solvable' if the line algorithms can finish it, 'needs-probing' if not
+    puzzle: Puzzle  # Never solved itself, each run gets a copy
+
+
+def get_corpus() -> list[BenchmarkPuzzle]:
+    return [
+        BenchmarkPuzzle('house', 'line-solvable', house),
+        BenchmarkPuzzle('zigzag', 'needs-probing', Puzzle(5, 5, [[2], [4], [3], [1], [1]], [[2], [2], [2], [3], [1, 1]])),
+        BenchmarkPuzzle('tabled', 'line-solvable', tabled),
+        BenchmarkPuzzle('poolside', 'line-solvable', poolside),
+        BenchmarkPuzzle('random-20', 'line-solvable', generate_random_puzzle(20, 20, 0.6, seed=1)),
+        BenchmarkPuzzle('random-50', 'line-solvable', generate_random_puzzle(50, 50, 0.7, seed=1)),
+    ]
+
+
+def run_benchmark(benchmark_puzzle: BenchmarkPuzzle, repeats: int, max_probes: int, adaptive: bool = False) -> dict:
+    best_wall_time = float('inf')
+
+    # Solving is deterministic, so every repeat has the same counts. Only the time varies, and we keep the best.
+    for _ in range(repeats):
+        result = solve_puzzle(benchmark_puzzle.puzzle.copy(), max_probes=max_probes, adaptive=adaptive)
+        best_wall_time = min(best_wall_time, result.wall_time)
+
+    return {
+        'name': benchmark_puzzle.name,
+        'size': f'{result.puzzle.num_rows}x{result.puzzle.num_columns}',
+        'difficulty': benchmark_puzzle.difficulty,
+        'complete': result.complete,
+        'wall_time': best_wall_time,
+        'rounds': result.rounds,
+        'line_evaluations': result.line_evaluations,
+        'probes': result.probes,
+        'squares_deduced': result.squares_deduced,
+    }
+
+
+# Returns a description of every way the results are worse than the baseline
+def find_regressions(results: list[dict], baseline: list[dict], time_tolerance: float) -> list[str]:
+    baseline_by_name = {result['name']: result for result in baseline}
+    regressions: list[str] = []
+
+    for result in results:
+        baseline_result = baseline_by_name.get(result['name'])
+        if baseline_result is None:
+            continue
+
+        name = result['name']
+        if baseline_result['complete'] and not result['complete']:
+            regressions.append(f'{name}: no longer completes')
+        time_difference = result['wall_time'] - baseline_result['wall_time']
+        if time_difference > baseline_result['wall_time'] * time_tolerance and time_difference > min_time_difference:
+            regressions.append(f"{name}: wall time {result['wall_time']:.4f}s, baseline {baseline_result['wall_time']:.4f}s")
+        for counter in ('rounds', 'line_evaluations', 'probes'):
+            if result[counter] > baseline_result[counter]:
+                regressions.append(f'{name}: {counter} {result[counter]}, baseline {baseline_result[counter]}')
+
+    return regressions
+
+
+def print_results(results: list[dict]) -> None:
+    print(f"{'puzzle':<12}{'size':>8}{'complete':>10}{'time (s)':>10}{'rounds':>8}{'lines':>8}{'probes':>8}  squares deduced")
+    for result in results:
+        squares_deduced = ', '.join(f'{name} {count}' for name, count in result['squares_deduced'].items())
+        print(f"{result['name']:<12}{result['size']:>8}{str(result['complete']):>10}{result['wall_time']:>10.4f}"
+              f"{result['rounds']:>8}{result['line_evaluations']:>8}{result['probes']:>8}  {squares_deduced}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the solver over a corpus of puzzles')
+    parser.add_argument('--output', default=default_results_path, help='Where to write the results')
+    parser.add_argument('--baseline', default=default_baseline_path, help='Results to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per puzzle, the best time is kept')
+    parser.add_argument('--max-probes', type=int, default=1000)
+    parser.add_argument('--time-tolerance', type=float, default=default_time_tolerance)
+    parser.add_argument('--adaptive', action='store_true', help='Let the solver pick the algorithm order as it goes')
+    args = parser.parse_args()
+
+    results = [run_benchmark(benchmark_puzzle, args.repeats, args.max_probes, args.adaptive) for benchmark_puzzle in get_corpus()]
+    print_results(results)
+
+    with open(args.output, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f'Stored results as the baseline in {args.baseline}')
+        return 0
+
+    try:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        print(f'No baseline at {args.baseline}, run with --update-baseline to make one')
+        return 0
+
+    regressions = find_regressions(results, baseline, args.time_tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if len(regressions) == 0:
+        print('No regressions against the baseline')
+
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
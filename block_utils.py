@@ -1,6 +1,6 @@
-from data_classes import CluedBlock, Line, VisibleBlock
+from data_classes import CluedBlock, Line, PuzzleContradiction, SquaresView, VisibleBlock
 from square import Square
-from utils import index_of, index_of_any, rev_list
+from utils import ReversedView, index_of
 
 
 # With CluedBlocks, Lines, and VisibleBlocks, we can derive some useful information about these same objects
@@ -15,6 +15,190 @@ from utils import index_of, index_of_any, rev_list
 # ==================================================================
 
 
+# ========================== Line Analysis =========================
+
+
+# Many of these deductions build on each other, so the same line gets asked the same questions over and over
+# e.g. the naive limits of every clued-block need the visible blocks, and every max-end needs the line reversed
+# A LineAnalysis remembers the answers for one line, so each of them is only worked out once
+# An analysis is only right for the squares it was worked out from. Algorithms return changes rather than making them, so squares
+# never change while one is running. But a Puzzle's Lines are live views (see SquaresView), so between runs they can change under us.
+# So whenever a square changes, the Puzzle drops the analyses of the row and column it's in, and get_line_analysis starts a new one
+# Lines with plain lists of squares are never changed once they're made, so an analysis of one is good for as long as the line is around
+class LineAnalysis:
+    line: Line
+
+    def __init__(self, line: Line) -> None:
+        self.line = line
+        self._squares: list[Square] | None = None
+        self._index: LineIndex | None = None
+        self._visible_blocks: list[VisibleBlock] | None = None
+        self._reversed: LineAnalysis | None = None
+        self._all_naive_limits: list[tuple[int, int]] | None = None
+        self._naive_limits: dict[CluedBlock, tuple[int, int]] = {}
+        self._block_mappings: dict[VisibleBlock, set[CluedBlock]] | None = None
+
+
+    # Reading a SquaresView one square at a time is much slower than reading a list, and the deductions read the same squares over and over
+    # So the first time they're needed, we unpack them into a list, once for this state of the line. Callers share it, so they mustn't modify it.
+    # (For a reversed line, this is a ReversedView of the list the forward line unpacked)
+    def get_squares(self) -> list[Square]:
+        if self._squares is None:
+            self._squares = list(self.line.squares) if isinstance(self.line.squares, SquaresView) else self.line.squares
+        return self._squares
+
+
+    def get_index(self) -> 'LineIndex':
+        if self._index is None:
+            self._index = LineIndex(self.get_squares())
+        return self._index
+
+
+    def get_visible_blocks(self) -> list[VisibleBlock]:
+        if self._visible_blocks is None:
+            self._visible_blocks = _find_visible_blocks(self.line)
+        return self._visible_blocks
+
+
+    # The reversed line is views onto this one's clued-blocks and squares, so reversing copies nothing
+    def get_reversed(self) -> 'LineAnalysis':
+        if self._reversed is None:
+            reversed_line = Line(ReversedView(self.line.clued_blocks), ReversedView(self.get_squares()), self.line.index, self.line.orientation, not self.line.is_reversed) # type: ignore[arg-type]
+            self._reversed = get_line_analysis(reversed_line)
+            self._reversed._reversed = self # Reversing back should give us this analysis, not a new one
+            # The visible blocks are the same ones seen from the other end, so there's no need to look for them again
+            self._reversed._visible_blocks = _get_mirrored_visible_blocks(self.get_visible_blocks(), len(reversed_line.squares))
+        return self._reversed
+
+
+    # Each clued-block's min-start depends on where the blocks before it can go, and its max-end on the blocks after it
+    # So one pass along the line finds every min-start, and one pass along the reversed line finds every max-end
+    def get_all_naive_limits(self) -> list[tuple[int, int]]:
+        if self._all_naive_limits is None:
+            min_starts = _get_all_min_starts(self.line)
+            inverted_min_starts = _get_all_min_starts(self.get_reversed().line)
+            line_length = len(self.line.squares)
+
+            all_naive_limits: list[tuple[int, int]] = []
+            for clued_block, min_start, inverted_min_start in zip(self.line.clued_blocks, min_starts, reversed(inverted_min_starts)):
+                naive_limits = (min_start, line_length - inverted_min_start - 1)
+                if naive_limits[1] - naive_limits[0] + 1 < clued_block.length:
+                    # The earliest it can start and the latest it can end don't leave it enough room
+                    raise PuzzleContradiction(f"Couldn't fit this CluedBlock anywhere! (limits {naive_limits[0]}-{naive_limits[1]}, length {clued_block.length})")
+                all_naive_limits.append(naive_limits)
+                self._naive_limits[clued_block] = naive_limits
+            self._all_naive_limits = all_naive_limits
+        return self._all_naive_limits
+
+
+    def get_naive_limits(self, clued_block: CluedBlock) -> tuple[int, int]:
+        if self._all_naive_limits is None:
+            self.get_all_naive_limits()
+        naive_limits = self._naive_limits.get(clued_block)
+        if naive_limits is None:
+            raise Exception('This CluedBlock is not part of this line')
+        return naive_limits
+
+
+    # Callers share the returned mapping, so they mustn't modify it
+    def get_block_mappings(self) -> dict[VisibleBlock, set[CluedBlock]]:
+        if self._block_mappings is None:
+            self._block_mappings = _find_possible_block_mappings(self.line)
+        return self._block_mappings
+
+
+def get_line_analysis(line: Line) -> LineAnalysis:
+    analysis = line.analysis
+    if analysis is None:
+        analysis = line.analysis = LineAnalysis(line)
+    return analysis
+
+
+
+# Callers share the returned list, so they mustn't modify it
+def get_line_squares(line: Line) -> list[Square]:
+    return get_line_analysis(line).get_squares()
+
+
+# The deductions keep asking the same few questions about where things are in a line: is there a dot between here and there,
+# where's the next filled square, where does this run of filled squares end. Scanning for the answer every time adds up.
+# A LineIndex answers them all by looking them up, from tables built in one pass over the squares. Each line state gets one (see LineAnalysis).
+#
+#   runs            The line as runs of the same square: (square, start, end), with end exclusive
+#   run_ends        For each square, the (exclusive) end of the run it's in
+#   next_filled     For each index, the first filled square at or after it, or the line length if there isn't one. Same for next_blank.
+#   last_filled     For each index, the last filled square before it, or -1 if there isn't one. Same for last_blank.
+#   filled_before   For each index, how many squares before it are filled. Same for blanks_before.
+#
+# All but runs and run_ends have an entry for the index just past the end of the line, so ranges that run to the end don't need special cases
+class LineIndex:
+    length: int
+    runs: list[tuple[Square, int, int]]
+    run_ends: list[int]
+    next_filled: list[int]
+    next_blank: list[int]
+    last_filled: list[int]
+    last_blank: list[int]
+    filled_before: list[int]
+    blanks_before: list[int]
+
+
+    def __init__(self, squares: list[Square]) -> None:
+        length = len(squares)
+        self.length = length
+        self.runs = []
+        self.run_ends = [length] * length
+        self.next_filled = [length] * (length + 1)
+        self.next_blank = [length] * (length + 1)
+        self.last_filled = [-1] * (length + 1)
+        self.last_blank = [-1] * (length + 1)
+        self.filled_before = [0] * (length + 1)
+        self.blanks_before = [0] * (length + 1)
+
+        run_start = 0
+        last_filled_index = -1
+        last_blank_index = -1
+        filled_count = 0
+        blank_count = 0
+        for square_index, square in enumerate(squares):
+            if square_index > 0 and square != squares[square_index - 1]:
+                self.runs.append((squares[run_start], run_start, square_index))
+                self.run_ends[run_start:square_index] = [square_index] * (square_index - run_start)
+                run_start = square_index
+
+            # Finding a square answers 'where's the next one' for every index since the last one we found
+            if square == Square.FILLED:
+                self.next_filled[last_filled_index + 1:square_index + 1] = [square_index] * (square_index - last_filled_index)
+                last_filled_index = square_index
+                filled_count += 1
+            elif square == Square.KNOWN_BLANK:
+                self.next_blank[last_blank_index + 1:square_index + 1] = [square_index] * (square_index - last_blank_index)
+                last_blank_index = square_index
+                blank_count += 1
+
+            self.last_filled[square_index + 1] = last_filled_index
+            self.last_blank[square_index + 1] = last_blank_index
+            self.filled_before[square_index + 1] = filled_count
+            self.blanks_before[square_index + 1] = blank_count
+
+        if length > 0:
+            self.runs.append((squares[run_start], run_start, length)) # run_ends already defaults to the length
+
+
+    def is_filled(self, square_index: int) -> bool:
+        return 0 <= square_index < self.length and self.next_filled[square_index] == square_index
+
+
+    # Whether there's a dot anywhere in start to end (exclusive). Either end can be past the edge of the line.
+    def has_blank(self, start: int, end: int) -> bool:
+        return self.last_blank[min(end, self.length)] >= start
+
+
+def get_line_index(line: Line) -> LineIndex:
+    return get_line_analysis(line).get_index()
+
+
+
 # ====================== CluedBlock Deductions =====================
 
 
@@ -22,7 +206,12 @@ from utils import index_of, index_of_any, rev_list
 # Deductions used: Can't sit on a dot, can't be extended by existing filled squares
 # Deductions ignored: VisibleBlock correspondance
 def get_naive_limits(clued_block: CluedBlock, line: Line) -> tuple[int, int]:
-    return (_get_min_start(clued_block, line), _get_max_end(clued_block, line))
+    return get_line_analysis(line).get_naive_limits(clued_block)
+
+
+# The naive limits of every clued-block in the line, in order. Callers share the returned list, so they mustn't modify it.
+def get_all_naive_limits(line: Line) -> list[tuple[int, int]]:
+    return get_line_analysis(line).get_all_naive_limits()
 
 
 def get_preceding_clued_blocks(clued_block: CluedBlock, line: Line) -> list[CluedBlock]:
@@ -45,26 +234,7 @@ def get_preceding_clued_blocks(clued_block: CluedBlock, line: Line) -> list[Clue
 
 
 def get_visible_blocks(line: Line) -> list[VisibleBlock]:
-    squares = line.squares
-    visible_blocks: list[VisibleBlock] = []
-    search_start = 0
-    index = 0
-
-    while search_start < len(squares):
-        next_filled_index = index_of(squares, Square.FILLED, search_start)
-        if next_filled_index == -1:
-            break # no more blocks visible in this line
-
-        next_unfilled_index = index_of_any(squares, [Square.KNOWN_BLANK, Square.UNKNOWN], next_filled_index + 1)
-        if next_unfilled_index == -1:
-            visible_blocks.append(VisibleBlock(next_filled_index, len(squares) - 1, index))
-            break
-        
-        visible_blocks.append(VisibleBlock(next_filled_index, next_unfilled_index - 1, index))
-        search_start = next_unfilled_index + 1
-        index += 1
-
-    return visible_blocks
+    return get_line_analysis(line).get_visible_blocks()
 
 
 
@@ -84,85 +254,166 @@ def get_span_limits(visible_blocks: list[VisibleBlock]) -> tuple[int, int]:
 
 
 
+# ==================== VisibleBlock to CluedBlock Mapping ===================
+
+
+def get_possible_block_mappings(line: Line) -> dict[VisibleBlock, set[CluedBlock]]:
+    return get_line_analysis(line).get_block_mappings()
+
+
+def get_candidate_clued_blocks(visible_block: VisibleBlock, line: Line) -> set[CluedBlock]:
+    candidates: set[CluedBlock] = set()
+
+    for clued_block, clued_block_limits in zip(line.clued_blocks, get_all_naive_limits(line)):
+        if visible_block.get_length() <= clued_block.length:
+            if visible_block.start >= clued_block_limits[0] and visible_block.end <= clued_block_limits[1]:
+                candidates.add(clued_block)
+
+    return candidates
+
+
+
 # ==================================================================
 # ======================== Private Functions ========================
 # ==================================================================
 
 
 
-def _get_min_start(target_clued_block: CluedBlock, line: Line) -> int:
+def _find_visible_blocks(line: Line) -> list[VisibleBlock]:
+    # Every run of filled squares is a visible-block
+    filled_runs = [(start, end) for square, start, end in get_line_index(line).runs if square == Square.FILLED]
+    return [VisibleBlock(start, end - 1, index) for index, (start, end) in enumerate(filled_runs)]
+
+
+def _find_possible_block_mappings(line: Line) -> dict[VisibleBlock, set[CluedBlock]]:
+    analysis = get_line_analysis(line)
+    visible_blocks = analysis.get_visible_blocks()
+    
+    visible_to_clued_block_map: dict[VisibleBlock, set[CluedBlock]] = {}
+    for visible_block in visible_blocks:
+        clued_blocks = get_candidate_clued_blocks(visible_block, line)
+        visible_to_clued_block_map[visible_block] = clued_blocks
+
+    # Visible-blocks appear in the same order as the clued-blocks they belong to, so this is an ordered matching problem
+    # One pass each way throws out every mapping that breaks that order, without comparing each visible-block against all the others
+    clue_positions = {clued_block: position for position, clued_block in enumerate(line.clued_blocks)}
+    _remove_forward_clue_violations(visible_blocks, visible_to_clued_block_map, clue_positions)
+    _remove_backward_clue_violations(visible_blocks, visible_to_clued_block_map, clue_positions)
+
+    for visible_block, candidate_clued_blocks in visible_to_clued_block_map.items():
+        if len(candidate_clued_blocks) == 0:
+            raise PuzzleContradiction(f'No clued-block can be the visible-block at {visible_block.start}-{visible_block.end}')
+
+    return visible_to_clued_block_map
+
+
+# Logic: If a visible-block is some clued-block, every later visible-block has to be a later clued-block, or that same clued-block stretched over both of them
+# So a later visible-block whose last candidate comes before our clued-block rules it out, and so does one whose last candidate is our clued-block, if it can't stretch that far
+# We go through the visible-blocks backwards, trimming each before the ones before it get checked against it
+# Then we only need to remember the lowest last candidate of the visible-blocks we've passed, and the furthest end of the ones that have it
+def _remove_forward_clue_violations(visible_blocks: list[VisibleBlock], visible_to_clued_block_map: dict[VisibleBlock, set[CluedBlock]], clue_positions: dict[CluedBlock, int]) -> None:
+    lowest_last_position = len(clue_positions) # Past every clued-block, so nothing is ruled out until we've passed a visible-block
+    furthest_end = -1
+
+    for visible_block in reversed(visible_blocks):
+        kept_clued_blocks = {
+            clued_block for clued_block in visible_to_clued_block_map[visible_block]
+            if clue_positions[clued_block] < lowest_last_position
+            or (clue_positions[clued_block] == lowest_last_position and clued_block.length >= furthest_end - visible_block.start + 1)
+        }
+        visible_to_clued_block_map[visible_block] = kept_clued_blocks
+
+        # With no candidates left, -1 rules out everything before us too. We'll raise a contradiction for it afterwards anyway.
+        last_position = max((clue_positions[clued_block] for clued_block in kept_clued_blocks), default=-1)
+        if last_position < lowest_last_position:
+            lowest_last_position = last_position
+            furthest_end = visible_block.end # Going backwards, the first visible-block we see with this last candidate is the one that ends furthest on
+
+
+# The same again the other way round: every earlier visible-block has to be an earlier clued-block, or this same one stretched back over both
+def _remove_backward_clue_violations(visible_blocks: list[VisibleBlock], visible_to_clued_block_map: dict[VisibleBlock, set[CluedBlock]], clue_positions: dict[CluedBlock, int]) -> None:
+    highest_first_position = -1
+    nearest_start = 0
+
+    for visible_block in visible_blocks:
+        kept_clued_blocks = {
+            clued_block for clued_block in visible_to_clued_block_map[visible_block]
+            if clue_positions[clued_block] > highest_first_position
+            or (clue_positions[clued_block] == highest_first_position and clued_block.length >= visible_block.end - nearest_start + 1)
+        }
+        visible_to_clued_block_map[visible_block] = kept_clued_blocks
+
+        first_position = min((clue_positions[clued_block] for clued_block in kept_clued_blocks), default=len(clue_positions))
+        if first_position > highest_first_position:
+            highest_first_position = first_position
+            nearest_start = visible_block.start
+
+
+
+# Drops each clued-block in turn as early as it can go, after the ones before it
+def _get_all_min_starts(line: Line) -> list[int]:
+    min_starts: list[int] = []
     possible_start = 0
 
     for clued_block in line.clued_blocks:
         possible_start = _get_next_possible_start_for_block(clued_block, line, possible_start)
-        if clued_block is target_clued_block:
-            return possible_start
+        min_starts.append(possible_start)
         possible_start += clued_block.length + 1 # + 1 ensures there's a gap after the block we just dropped
 
-    raise Exception('No min-start found')
-
-
-def _get_max_end(target_clued_block: CluedBlock, line: Line) -> int:
-    reversed_line = get_reversed_line(line)
-    inverted_min_start = _get_min_start(target_clued_block, reversed_line)
-    return len(line.squares) - inverted_min_start - 1
+    return min_starts
 
 
 def _get_next_possible_start_for_block(clued_block: CluedBlock, line: Line, possible_start: int) -> int:
-    visible_blocks = get_visible_blocks(line)
+    line_index = get_line_index(line)
 
-    while possible_start < len(line.squares):
-        possible_start = _get_next_space_not_blocked_by_dot(line, clued_block, possible_start)
+    while possible_start < line_index.length:
+        possible_start = _get_next_space_not_blocked_by_dot(line_index, clued_block, possible_start)
 
         # We may have landed touching a visible-block, which drags the clued-block forward. Otherwise it would make it longer.
-        possible_start += get_amount_extended_forward(clued_block, possible_start, visible_blocks)
+        possible_start += get_amount_extended_forward(clued_block, possible_start, line_index)
 
         # But now, after dragging forward, another visible-block may be extending us backward
-        if is_extended_backward(clued_block, possible_start, visible_blocks):
-            possible_start += 1 # We just creep forwards and see what happens
+        if is_extended_backward(clued_block, possible_start, line_index):
+            possible_start = get_start_after_extending_block(possible_start, line_index)
         else:
             return possible_start
 
-    raise Exception("Couldn't fit this CluedBlock anywhere!")
+    raise PuzzleContradiction("Couldn't fit this CluedBlock anywhere!")
 
 
-def get_amount_extended_forward(clued_block: CluedBlock, start: int, visible_blocks: list[VisibleBlock]) -> int:
+# A visible-block touching the square after the clued-block would make it longer, so it has to move forward to the end of that visible-block
+def get_amount_extended_forward(clued_block: CluedBlock, start: int, line_index: LineIndex) -> int:
     index_immediately_after_block = start + clued_block.length
-    for visible_block in visible_blocks:
-        if visible_block.start > index_immediately_after_block:
-            return 0 # As soon as we are on visible-blocks after this space, we don't need to check any more
-        if visible_block.end >= index_immediately_after_block:
-            return visible_block.end - start - clued_block.length + 1
+    if line_index.is_filled(index_immediately_after_block):
+        return line_index.run_ends[index_immediately_after_block] - index_immediately_after_block
     return 0
 
 
-def is_extended_backward(clued_block: CluedBlock, start: int, visible_blocks: list[VisibleBlock]) -> bool:
-    index_immediately_before_block = start - 1
-    for visible_block in visible_blocks:
-        if visible_block.start > index_immediately_before_block:
-            return False # As soon as we are passed the beginning of the CluedBlock, we don't need to check any more VisibleBlocks
-        if visible_block.end >= index_immediately_before_block:
-            return True
-    return False
+def is_extended_backward(clued_block: CluedBlock, start: int, line_index: LineIndex) -> bool:
+    return line_index.is_filled(start - 1)
 
 
-def is_on_a_dot(clued_block: CluedBlock, start: int, line: Line) -> bool:
-    sub_line = line.squares[start:start + clued_block.length]
-    sub_index_of_wall = index_of(sub_line, Square.KNOWN_BLANK)
-    return sub_index_of_wall > -1
+# If a visible-block is extending a clued-block backward, it would for every start up to the end of that visible-block too
+# So rather than creeping forward a square at a time, we can go straight to the first start that leaves a gap after it
+def get_start_after_extending_block(start: int, line_index: LineIndex) -> int:
+    return line_index.run_ends[start - 1] + 1
 
 
-def _get_next_space_not_blocked_by_dot(line: Line, clued_block:CluedBlock, start: int) -> int:
-    sub_line = line.squares[start:start + clued_block.length]
-    sub_index_of_wall = index_of(sub_line, Square.KNOWN_BLANK)
-    if sub_index_of_wall > -1:
-        return _get_next_space_not_blocked_by_dot(line, clued_block, start + sub_index_of_wall + 1)
+def is_on_a_dot(clued_block: CluedBlock, start: int, line: Line) -> bool:
+    return get_line_index(line).has_blank(start, start + clued_block.length)
+
 
-    return start
-    # Any failure cases here?
+def _get_next_space_not_blocked_by_dot(line_index: LineIndex, clued_block:CluedBlock, start: int) -> int:
+    # Hop past the last dot in the way, until there isn't one
+    last_blank = line_index.last_blank
+    line_length = line_index.length
+    while True:
+        last_blank_in_the_way = last_blank[min(start + clued_block.length, line_length)]
+        if last_blank_in_the_way < start:
+            return start
+        start = last_blank_in_the_way + 1
 
 
-def get_reversed_line(line: Line) -> Line:
-    reversed_clues = rev_list(line.clued_blocks)
-    reversed_squares = rev_list(line.squares)
-    return Line(reversed_clues, reversed_squares, line.index, line.orientation, not line.is_reversed)
\ No newline at end of file
+def _get_mirrored_visible_blocks(visible_blocks: list[VisibleBlock], line_length: int) -> list[VisibleBlock]:
+    last_index = len(visible_blocks) - 1
+    return [VisibleBlock(line_length - 1 - visible_block.end, line_length - 1 - visible_block.start, last_index - visible_block.index) for visible_block in reversed(visible_blocks)]
\ No newline at end of file
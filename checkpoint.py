@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+import json
+import os
+from puzzle import Puzzle
+from puzzle_files import encode_binary_puzzle, read_binary_puzzle_clues
+
+if TYPE_CHECKING:
+    from solver import PuzzleSolver
+
+
+# A checkpoint is everything we need to pick a solve back up: the clues, every square we know, and the solver's counters
+# PuzzleSolver writes one every so often if it's given a checkpoint_path, and solve_puzzle can carry on from one: solve_puzzle(..., checkpoint=load_checkpoint(path))
+# The layout is:
+#
+#   magic bytes, then a 4 byte little-endian length and that many bytes of JSON metadata (the solver's counters)
+#   the clues, in the same layout as one puzzle in a .hjb file
+#   the grid, 2 bits per square: for each row, its filled mask and then its blank mask, each in ceil(columns / 8) little-endian bytes
+#
+# Which lines were dirty isn't saved. Resuming marks every line dirty, which costs a round but can never miss anything.
+
+checkpoint_magic = b'HJC1'
+
+
+@dataclass
+class Checkpoint:
+    puzzle: Puzzle
+    rounds: int = 0
+    line_evaluations: int = 0
+    probes: int = 0
+    squares_deduced: dict[str, int] = field(default_factory=dict)
+
+
+def write_checkpoint(path: str, solver: 'PuzzleSolver') -> None:
+    puzzle = solver.puzzle
+    metadata = {
+        'rounds': solver.rounds,
+        'line_evaluations': solver.line_evaluations,
+        'probes': solver.probes,
+        'squares_deduced': solver.squares_deduced,
+    }
+    metadata_bytes = json.dumps(metadata).encode('utf-8')
+
+    row_bytes = (puzzle.num_columns + 7) // 8
+    grid_bytes = bytearray()
+    for row_index in range(puzzle.num_rows):
+        filled_mask, blank_mask = puzzle.get_row_masks(row_index)
+        grid_bytes += filled_mask.to_bytes(row_bytes, 'little')
+        grid_bytes += blank_mask.to_bytes(row_bytes, 'little')
+
+    # Write to a temporary file and swap it in, so a crash part way through leaves the last checkpoint as it was
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as checkpoint_file:
+        checkpoint_file.write(checkpoint_magic)
+        checkpoint_file.write(len(metadata_bytes).to_bytes(4, 'little'))
+        checkpoint_file.write(metadata_bytes)
+        checkpoint_file.write(encode_binary_puzzle(puzzle))
+        checkpoint_file.write(grid_bytes)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temporary_path, path)
+
+
+def load_checkpoint(path: str) -> Checkpoint:
+    with open(path, 'rb') as checkpoint_file:
+        data = checkpoint_file.read()
+    if data[:len(checkpoint_magic)] != checkpoint_magic:
+        raise Exception(f'Not a checkpoint file: {path}')
+
+    position = len(checkpoint_magic)
+    metadata_length = int.from_bytes(data[position:position + 4], 'little')
+    position += 4
+    metadata = json.loads(data[position:position + metadata_length])
+    position += metadata_length
+
+    (row_clues, column_clues), position = read_binary_puzzle_clues(data, position)
+    puzzle = Puzzle(len(row_clues), len(column_clues), row_clues, column_clues)
+
+    row_bytes = (puzzle.num_columns + 7) // 8
+    if len(data) - position != puzzle.num_rows * row_bytes * 2:
+        raise Exception(f'Checkpoint grid is the wrong size for a {puzzle.num_rows}x{puzzle.num_columns} puzzle: {path}')
+    row_filled: list[int] = []
+    row_blank: list[int] = []
+    for _ in range(puzzle.num_rows):
+        row_filled.append(int.from_bytes(data[position:position + row_bytes], 'little'))
+        row_blank.append(int.from_bytes(data[position + row_bytes:position + row_bytes * 2], 'little'))
+        position += row_bytes * 2
+    puzzle.set_row_masks(row_filled, row_blank)
+
+    return Checkpoint(puzzle, metadata['rounds'], metadata['line_evaluations'], metadata['probes'], metadata['squares_deduced'])
@@ -1,5 +1,10 @@
-from dataclasses import dataclass
-from square import Square
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterator, Sequence, overload
+from square import Square, decode_squares, encode_squares
+
+if TYPE_CHECKING:
+    from block_utils import LineAnalysis
+    from puzzle import Puzzle
 
 
 # On the surface, a hanjie puzzle is about filling in squares to satisfy a bunch of clues about the lines
@@ -8,6 +13,13 @@ from square import Square
 # This module therefore provides the classes that match this model
 
 
+# Raised when the squares we know can't be part of any solution, e.g. when a deduction contradicts an earlier one
+# While solving normally this means a bug, but when we're trying out guesses it tells us the guess was wrong
+# It lives down here rather than in puzzle, so anything that works on lines can raise it without depending on Puzzle
+class PuzzleContradiction(Exception):
+    pass
+
+
 @dataclass
 class CluedBlock:
     length: int
@@ -38,15 +50,198 @@ class VisibleBlock:
         return id(self)
 
 
-@dataclass
+# The squares of one row or column of a Puzzle, read straight out of the puzzle's masks
+# It reads like a list of Squares, but nothing is copied, and it always shows the grid as it is now, not as it was when we got it
+# Setting a square sets it in the puzzle (both the row and the column), so it can't disagree with the grid either
+# Slices, iterating and reversing do hand out plain lists, since whoever asked for them is going to walk through every square anyway
+# It's a Sequence, so anything that only reads squares can take one of these or a list
+class SquaresView(Sequence[Square]):
+    __slots__ = ('_puzzle', '_filled_masks', '_blank_masks', '_orientation', '_line_index', '_length')
+
+
+    def __init__(self, puzzle: 'Puzzle', filled_masks: list[int], blank_masks: list[int], orientation: str, line_index: int, length: int) -> None:
+        self._puzzle = puzzle
+        self._filled_masks = filled_masks
+        self._blank_masks = blank_masks
+        self._orientation = orientation
+        self._line_index = line_index
+        self._length = length
+
+
+    def get_masks(self) -> tuple[int, int]:
+        return (self._filled_masks[self._line_index], self._blank_masks[self._line_index])
+
+
+    def __len__(self) -> int:
+        return self._length
+
+
+    @overload
+    def __getitem__(self, key: int) -> Square: ...
+    @overload
+    def __getitem__(self, key: slice) -> list[Square]: ...
+    def __getitem__(self, key: int | slice) -> Square | list[Square]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._length)
+            if step != 1:
+                return decode_squares(*self.get_masks(), self._length)[key]
+            # Shift the part we want down to the bottom of the masks, and only unpack that
+            length = max(0, stop - start)
+            slice_mask = (1 << length) - 1
+            return decode_squares(self._filled_masks[self._line_index] >> start & slice_mask, self._blank_masks[self._line_index] >> start & slice_mask, length)
+
+        square_index = key + self._length if key < 0 else key
+        if not 0 <= square_index < self._length:
+            raise IndexError(f'Square {key} is outside a line of length {self._length}')
+        if self._filled_masks[self._line_index] >> square_index & 1:
+            return Square.FILLED
+        if self._blank_masks[self._line_index] >> square_index & 1:
+            return Square.KNOWN_BLANK
+        return Square.UNKNOWN
+
+
+    def __setitem__(self, key: int, value: Square) -> None:
+        square_index = key + self._length if key < 0 else key
+        if not 0 <= square_index < self._length:
+            raise IndexError(f'Square {key} is outside a line of length {self._length}')
+        if self._orientation == 'row':
+            self._puzzle.apply_line_changes({square_index: value}, row_index=self._line_index)
+        else:
+            self._puzzle.apply_line_changes({square_index: value}, column_index=self._line_index)
+
+
+    def __iter__(self) -> Iterator[Square]:
+        return iter(decode_squares(*self.get_masks(), self._length))
+
+
+    def __reversed__(self) -> Iterator[Square]:
+        return reversed(decode_squares(*self.get_masks(), self._length))
+
+
+    def __contains__(self, value: object) -> bool:
+        filled_mask, blank_mask = self.get_masks()
+        if value == Square.FILLED:
+            return filled_mask != 0
+        if value == Square.KNOWN_BLANK:
+            return blank_mask != 0
+        if value == Square.UNKNOWN:
+            return filled_mask | blank_mask != (1 << self._length) - 1
+        return False
+
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, SquaresView):
+            return self._length == other._length and self.get_masks() == other.get_masks()
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+
+    def __repr__(self) -> str:
+        return f'SquaresView({list(self)!r})'
+
+
+# A Puzzle hands out the same Line for a row or column every time, with its squares as a SquaresView, so getting a line costs nothing
+# Lines built any other way (reversed lines, lines in tests, lines sent to another process) just have a list of squares
+@dataclass(slots=True)
 class Line:
     clued_blocks: list[CluedBlock]
-    squares: list[Square]
+    squares: list[Square] | SquaresView
     index: int        # For debugging
     orientation: str  # For debugging
     is_reversed: bool # For debugging
 
+    # Deductions about this line are remembered here once they've been worked out, see block_utils.get_line_analysis
+    # For a Puzzle's lines the squares can change underneath it, so get_line_analysis checks it still matches them before using it
+    analysis: 'LineAnalysis | None' = field(default=None, init=False, repr=False, compare=False)
+
     # Things we will compute:
     # --> Visible blocks
     # --> Known-blanks (Squares that no blocks can fall into)
     # --> Filled squares (Even if we don't know which CluedBlock it must be)
+
+
+# What a LineAlgorithm deduces about a line: square index -> the value it must have
+# Most runs deduce little or nothing, so we only store the squares that were deduced, and checking or applying them is O(deductions)
+# It still knows the line's length, and indexes like the list it used to be: slices work (and read back as lists), negative indexes
+# count from the end, indexes off the end raise IndexError, and squares that weren't deduced read as UNKNOWN
+# Everything else is the dict's though: len, iterating, and 'in' only see the deduced squares. Use length or to_list for the whole line.
+class LineChanges(dict[int, Square]):
+    length: int
+
+
+    def __init__(self, length: int) -> None:
+        super().__init__()
+        self.length = length
+
+
+    @classmethod
+    def from_masks(cls, filled_mask: int, blank_mask: int, length: int) -> 'LineChanges':
+        line_changes = cls(length)
+        for mask, square in ((filled_mask, Square.FILLED), (blank_mask, Square.KNOWN_BLANK)):
+            while mask:
+                lowest_bit = mask & -mask
+                dict.__setitem__(line_changes, lowest_bit.bit_length() - 1, square)
+                mask ^= lowest_bit
+        return line_changes
+
+
+    @overload
+    def __setitem__(self, key: int, value: Square) -> None: ...
+    @overload
+    def __setitem__(self, key: slice, value: list[Square]) -> None: ...
+    def __setitem__(self, key: int | slice, value: Square | list[Square]) -> None:
+        if isinstance(key, slice):
+            dict.update(self, zip(range(*key.indices(self.length)), value)) # type: ignore[arg-type]
+            return
+
+        square_index = key + self.length if key < 0 else key
+        if not 0 <= square_index < self.length:
+            raise IndexError(f'Square {key} is outside a line of length {self.length}')
+        dict.__setitem__(self, square_index, value) # type: ignore[misc]
+
+
+    @overload
+    def __getitem__(self, key: int) -> Square: ...
+    @overload
+    def __getitem__(self, key: slice) -> list[Square]: ...
+    def __getitem__(self, key: int | slice) -> Square | list[Square]:
+        if isinstance(key, slice):
+            return [dict.get(self, square_index, Square.UNKNOWN) for square_index in range(*key.indices(self.length))]
+
+        square_index = key + self.length if key < 0 else key
+        if not 0 <= square_index < self.length:
+            raise IndexError(f'Square {key} is outside a line of length {self.length}')
+        return dict.get(self, square_index, Square.UNKNOWN)
+
+
+    def copy(self) -> 'LineChanges':
+        line_changes = LineChanges(self.length)
+        dict.update(line_changes, self)
+        return line_changes
+
+
+    # The whole line, with UNKNOWN for every square that wasn't deduced
+    def to_list(self) -> list[Square]:
+        squares = [Square.UNKNOWN] * self.length
+        for square_index, square in self.items():
+            squares[square_index] = square
+        return squares
+
+
+
+# Line algorithms only look at the clue lengths and the squares, so a line can be boiled down to a few ints
+# This is handy for cache keys, or for sending lines to another process without pickling the whole Line
+type EncodedLine = tuple[tuple[int, ...], int, int, int] # (clue lengths, filled mask, blank mask, line length)
+
+
+def encode_line(line: Line) -> EncodedLine:
+    squares = line.squares
+    filled_mask, blank_mask = squares.get_masks() if isinstance(squares, SquaresView) else encode_squares(squares)
+    return (tuple(clued_block.length for clued_block in line.clued_blocks), filled_mask, blank_mask, len(line.squares))
+
+
+def decode_line(encoded_line: EncodedLine, index: int = 0, orientation: str = 'row') -> Line:
+    clue_lengths, filled_mask, blank_mask, length = encoded_line
+    clued_blocks = [CluedBlock(clue_length, clue_index) for clue_index, clue_length in enumerate(clue_lengths)]
+    return Line(clued_blocks, decode_squares(filled_mask, blank_mask, length), index, orientation, False)
@@ -182,4 +182,13 @@ poolside = Puzzle(
         [6, 2, 12, 2, 2],
         [12, 1, 1, 5]
     ]
+)
+
+# A little house: a roof, walls and a door. The line algorithms solve it without needing to probe.
+# It's small enough to check by eye, so the tests use it a lot. Solving it fills it in, so take a copy() first.
+house = Puzzle(
+    num_rows = 5,
+    num_columns = 5,
+    row_clues = [[1], [3], [5], [1, 1], [1, 1]],
+    column_clues = [[3], [2], [3], [2], [3]]
 )
\ No newline at end of file
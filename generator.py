@@ -0,0 +1,86 @@
+import random
+from puzzle import Puzzle
+from square import transpose_masks
+
+
+# Builds puzzles from pictures, so we can test with puzzles much bigger than anything we'd want to type in by hand
+# A bitmap is one int per row, with bit i set if column i is filled - the same layout the Puzzle uses for its rows
+# Random bitmaps aren't guaranteed to have a unique solution, or to be solvable by the line algorithms alone,
+# so a generated puzzle might need probing (or might not finish at all). Denser bitmaps tend to be easier.
+
+type Bitmap = list[int]
+
+max_size = 1000
+
+
+def generate_random_bitmap(num_rows: int, num_columns: int, density: float = 0.5, seed: int|None = None) -> Bitmap:
+    _check_size(num_rows, num_columns)
+    if not 0 <= density <= 1:
+        raise Exception(f'Density must be between 0 and 1 (got {density})')
+
+    # Our own Random, so a seed always gives the same bitmap no matter what else is using the random module
+    rng = random.Random(seed)
+    bitmap: Bitmap = []
+    for _ in range(num_rows):
+        row_mask = 0
+        for column_index in range(num_columns):
+            if rng.random() < density:
+                row_mask |= 1 << column_index
+        bitmap.append(row_mask)
+    return bitmap
+
+
+# Dark pixels become filled squares. Needs pygame, which is only imported if you actually load an image.
+# Returns the image width too, since the masks alone can't tell us about blank columns on the right.
+def load_image_bitmap(image_path: str, threshold: int = 128) -> tuple[Bitmap, int]:
+    import pygame
+
+    surface = pygame.image.load(image_path)
+    num_columns, num_rows = surface.get_size()
+    _check_size(num_rows, num_columns)
+
+    # One call to get all the pixels, rather than a get_at per pixel
+    pixels = pygame.image.tobytes(surface, 'RGB')
+    bitmap: Bitmap = []
+    for row_index in range(num_rows):
+        row_start = row_index * num_columns * 3
+        row_mask = 0
+        for column_index in range(num_columns):
+            pixel_start = row_start + column_index * 3
+            red, green, blue = pixels[pixel_start:pixel_start + 3]
+            # Rough perceived brightness, good enough for telling black from white
+            if (red * 299 + green * 587 + blue * 114) // 1000 < threshold:
+                row_mask |= 1 << column_index
+        bitmap.append(row_mask)
+    return (bitmap, num_columns)
+
+
+def puzzle_from_bitmap(bitmap: Bitmap, num_columns: int) -> Puzzle:
+    num_rows = len(bitmap)
+    _check_size(num_rows, num_columns)
+    return Puzzle(num_rows, num_columns, [get_mask_clues(row_mask) for row_mask in bitmap], [get_mask_clues(column_mask) for column_mask in transpose_bitmap(bitmap, num_columns)])
+
+
+def generate_random_puzzle(num_rows: int, num_columns: int, density: float = 0.5, seed: int|None = None) -> Puzzle:
+    return puzzle_from_bitmap(generate_random_bitmap(num_rows, num_columns, density, seed), num_columns)
+
+
+def load_image_puzzle(image_path: str, threshold: int = 128) -> Puzzle:
+    bitmap, num_columns = load_image_bitmap(image_path, threshold)
+    return puzzle_from_bitmap(bitmap, num_columns)
+
+
+# The lengths of each run of set bits, lowest bit first. Empty lines have no clues at all.
+def get_mask_clues(mask: int) -> list[int]:
+    # bin() and split() do the scanning in C, which matters when there are a million squares to get through
+    # The bits come out highest first, so reverse them to start from square 0
+    return [len(run) for run in bin(mask)[:1:-1].split('0') if run]
+
+
+def transpose_bitmap(bitmap: Bitmap, num_columns: int) -> Bitmap:
+    return transpose_masks(bitmap, num_columns)
+
+
+def _check_size(num_rows: int, num_columns: int) -> None:
+    if not (1 <= num_rows <= max_size and 1 <= num_columns <= max_size):
+        raise Exception(f'Puzzles can be from 1x1 up to {max_size}x{max_size} (got {num_rows}x{num_columns})')
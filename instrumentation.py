@@ -0,0 +1,125 @@
+from dataclasses import dataclass, field
+import json
+import random
+from solver import LineId
+
+
+# Records what each line algorithm costs and what it finds, so we can tell which ones are pulling their weight
+# Hand a SolverProfiler to a PuzzleSolver and it gets told about every algorithm run. Without one the solver doesn't time anything.
+# Results can be written out as JSON, or as collapsed stacks for flamegraph.pl / speedscope / inferno:
+#
+#   solve;check_overlaps 1234            (microseconds spent in check_overlaps)
+#   solve;check_overlaps;row 3 56        (per_line=True splits that up by line)
+
+
+# Keeping every run's latency would use more and more memory the longer a solve goes on, so we only keep a sample of them
+# Once an AlgorithmStats has max_latency_samples, each new run replaces a random one of them with a chance of max_latency_samples / calls
+# (reservoir sampling), so every run is equally likely to be in the sample. Percentiles are exact until the sample fills up.
+max_latency_samples = 1000
+latency_sampler = random.Random(0) # Seeded, so profiling the same solve twice picks the same sample
+
+
+@dataclass
+class AlgorithmStats:
+    calls: int = 0
+    no_op_calls: int = 0 # Runs that didn't deduce anything new
+    squares_deduced: int = 0
+    total_ns: int = 0
+    max_ns: int = 0 # Kept separately, since the slowest run might not be in the sample
+    latencies_ns: list[int] = field(default_factory=list, repr=False) # A sample of at most max_latency_samples, see above
+
+
+    def record(self, elapsed_ns: int, squares_deduced: int) -> None:
+        self.calls += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+        if len(self.latencies_ns) < max_latency_samples:
+            self.latencies_ns.append(elapsed_ns)
+        else:
+            sample_index = latency_sampler.randrange(self.calls)
+            if sample_index < max_latency_samples:
+                self.latencies_ns[sample_index] = elapsed_ns
+        self.squares_deduced += squares_deduced
+        if squares_deduced == 0:
+            self.no_op_calls += 1
+
+
+    def to_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'no_op_calls': self.no_op_calls,
+            'squares_deduced': self.squares_deduced,
+            'total_ms': self.total_ns / 1e6,
+            'p50_us': get_percentile(self.latencies_ns, 50) / 1e3,
+            'p90_us': get_percentile(self.latencies_ns, 90) / 1e3,
+            'p99_us': get_percentile(self.latencies_ns, 99) / 1e3,
+            'max_us': self.max_ns / 1e3,
+        }
+
+
+class SolverProfiler:
+    per_line: bool
+    algorithm_stats: dict[str, AlgorithmStats]
+    line_stats: dict[tuple[str, LineId], AlgorithmStats] # Only filled in if per_line is set
+
+
+    def __init__(self, per_line: bool = False) -> None:
+        self.per_line = per_line
+        self.algorithm_stats = {}
+        self.line_stats = {}
+
+
+    def record(self, algorithm_name: str, line_id: LineId, elapsed_ns: int, squares_deduced: int) -> None:
+        algorithm_stats = self.algorithm_stats.get(algorithm_name)
+        if algorithm_stats is None:
+            algorithm_stats = self.algorithm_stats[algorithm_name] = AlgorithmStats()
+        algorithm_stats.record(elapsed_ns, squares_deduced)
+
+        if self.per_line:
+            line_stats = self.line_stats.get((algorithm_name, line_id))
+            if line_stats is None:
+                line_stats = self.line_stats[(algorithm_name, line_id)] = AlgorithmStats()
+            line_stats.record(elapsed_ns, squares_deduced)
+
+
+    def to_dict(self) -> dict:
+        result: dict = {'algorithms': {algorithm_name: stats.to_dict() for algorithm_name, stats in self.algorithm_stats.items()}}
+        if self.per_line:
+            result['lines'] = [{'algorithm': algorithm_name, 'orientation': orientation, 'index': line_index, **stats.to_dict()}
+                               for (algorithm_name, (orientation, line_index)), stats in self.line_stats.items()]
+        return result
+
+
+    def write_json(self, path: str) -> None:
+        with open(path, 'w') as json_file:
+            json.dump(self.to_dict(), json_file, indent=2)
+
+
+    def get_collapsed_stacks(self) -> list[str]:
+        if self.per_line:
+            return [f'solve;{algorithm_name};{orientation} {line_index} {stats.total_ns // 1000}'
+                    for (algorithm_name, (orientation, line_index)), stats in self.line_stats.items()]
+        return [f'solve;{algorithm_name} {stats.total_ns // 1000}' for algorithm_name, stats in self.algorithm_stats.items()]
+
+
+    def write_collapsed_stacks(self, path: str) -> None:
+        with open(path, 'w') as stacks_file:
+            stacks_file.write(''.join(stack + '\n' for stack in self.get_collapsed_stacks()))
+
+
+    def print_summary(self) -> None:
+        print(f"{'algorithm':<40}{'calls':>8}{'no-ops':>8}{'squares':>9}{'total ms':>10}{'p50 us':>9}{'p99 us':>9}")
+        for algorithm_name, stats in sorted(self.algorithm_stats.items(), key=lambda item: item[1].total_ns, reverse=True):
+            stats_dict = stats.to_dict()
+            print(f"{algorithm_name:<40}{stats.calls:>8}{stats.no_op_calls:>8}{stats.squares_deduced:>9}"
+                  f"{stats_dict['total_ms']:>10.1f}{stats_dict['p50_us']:>9.1f}{stats_dict['p99_us']:>9.1f}")
+
+
+# Nearest-rank percentile, which is always one of the values we actually saw
+def get_percentile(values: list[int], percentile: float) -> int:
+    if len(values) == 0:
+        return 0
+    sorted_values = sorted(values)
+    rank = max(1, -(-len(sorted_values) * percentile // 100))
+    return sorted_values[int(rank) - 1]
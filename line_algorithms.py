@@ -1,19 +1,17 @@
 from typing import Callable
-from block_utils import get_amount_extended_forward, get_reversed_line, get_naive_limits, get_preceding_clued_blocks, get_span, get_span_limits, get_visible_blocks, is_extended_backward, is_on_a_dot
-from data_classes import CluedBlock, Line, VisibleBlock
+from block_utils import LineIndex, get_all_naive_limits, get_amount_extended_forward, get_line_index, get_line_squares, get_naive_limits, get_possible_block_mappings, get_span_limits, get_start_after_extending_block, get_visible_blocks, is_extended_backward
+from data_classes import CluedBlock, Line, LineChanges, PuzzleContradiction, VisibleBlock
 from square import Square
-from utils import index_of, rev_list
+from utils import rev_list
 
-# A LineAlgorithm considers a line and returns a list of deduced changes
-# The form of these changes is the same as a Line, but we give it its own type to communicate its purpose
-# We don't want to mislead a developer that the output of an algorithm is the final result. It must be added.
-type LineChanges = list[Square]
+# A LineAlgorithm considers a line and returns the changes it deduced, as a LineChanges (see data_classes)
+# We give these their own type rather than handing back squares, so nobody mistakes the output of an algorithm for the final result. It must be added.
 type LineAlgorithm = Callable[[Line], LineChanges]
 
 
 def check_overlaps(line: Line) -> LineChanges:
     line_changes = _get_blank_line_changes(line)
-    block_limits_list = [get_naive_limits(clued_block, line) for clued_block in line.clued_blocks]
+    block_limits_list = get_all_naive_limits(line)
 
     for block_index, block_limits in enumerate(block_limits_list):
         block_length = line.clued_blocks[block_index].length
@@ -36,14 +34,15 @@ def check_overlaps(line: Line) -> LineChanges:
 def check_edge_hints(line: Line) -> LineChanges:
     line_changes = _get_blank_line_changes(line)
     block_lengths = [clued_block.length for clued_block in line.clued_blocks]
-    squares = line.squares
+    squares = get_line_squares(line)
+    line_index = get_line_index(line)
 
     if len(block_lengths) == 0:
         return line_changes
 
     block_length = block_lengths[0]
-    filled_index = index_of(squares[:block_length], Square.FILLED)
-    if filled_index > -1:
+    filled_index = line_index.next_filled[0]
+    if filled_index < block_length and filled_index < len(squares):
         for index in range(filled_index, block_length):
             if squares[index] != Square.FILLED:
                 line_changes[index] = Square.FILLED
@@ -54,9 +53,9 @@ def check_edge_hints(line: Line) -> LineChanges:
 
     block_length = block_lengths[len(block_lengths) - 1]
     subline_start = len(squares) - block_length
-    inverted_filled_index = index_of(rev_list(squares[subline_start:]), Square.FILLED)
-    if inverted_filled_index > -1:
-        filled_index = len(squares) - inverted_filled_index - 1
+    filled_index = line_index.last_filled[len(squares)]
+    if filled_index > -1 and filled_index >= subline_start:
+        inverted_filled_index = len(squares) - filled_index - 1
         for index in range(subline_start, filled_index):
             if squares[index] != Square.FILLED:
                 line_changes[index] = Square.FILLED
@@ -110,14 +109,10 @@ def check_possible_visible_clued_mappings(line: Line) -> LineChanges:
         minimum_candidate_length = min([clued_block.length for clued_block in candidate_clued_blocks])
         visible_block_length = visible_block.get_length()
         if visible_block_length < minimum_candidate_length:
-            index_of_next_dot = index_of(line.squares, Square.KNOWN_BLANK, visible_block.end + 1)
-            index_of_previous_dot = len(line.squares) - index_of(rev_list(line.squares), Square.KNOWN_BLANK, len(line.squares) - visible_block.start) - 1
-
-            # If there's either no dot before or after, we replace it with the index of the edge of the line
-            # I'm not convinced this needs handling, thanks to knowing that we run the simple check_edge_hints algorithm earlier
-            # But can't hurt, might avoid some bug cases
-            index_of_next_dot = index_of_next_dot if index_of_next_dot > -1 else len(line.squares)
-            # interestingly, we don't have to do this with previous dot, since the index we would assign it is -1 anyway
+            # If there's no dot before or after, the edge of the line does the same job, so we get the index just past the edge
+            line_index = get_line_index(line)
+            index_of_next_dot = line_index.next_blank[visible_block.end + 1]
+            index_of_previous_dot = line_index.last_blank[visible_block.start]
 
             distance_to_next_dot = index_of_next_dot - visible_block.end
             distance_to_previous_dot = visible_block.start - index_of_previous_dot
@@ -139,7 +134,7 @@ def check_possible_visible_clued_mappings(line: Line) -> LineChanges:
             for clued_block in candidate_clued_blocks:
                 # First get all the starts where this clued-block is valid, given that it is this visible-block
                 start_search_range = (visible_block.end - clued_block.length + 1, visible_block.start)
-                possible_starts = get_possible_starts_in_range(clued_block, get_visible_blocks(line), line, start_search_range)
+                possible_starts = get_possible_starts_in_range(clued_block, get_line_index(line), start_search_range)
                 filled_square_search_range = (start_search_range[0], visible_block.start + clued_block.length - 1)
                 for square_index in range(filled_square_search_range[0], filled_square_search_range[1]):
                     # Check this square is in every possible position for this clued_block
@@ -199,89 +194,105 @@ def is_in_every_possible_clued_block_position(square_index: int, possible_starts
 
 
 def get_possible_starts_in_range(clued_block: CluedBlock,
-                                 visible_blocks: list[VisibleBlock],
-                                 line: Line,
+                                 line_index: LineIndex,
                                  search_range: tuple[int, int]) -> set[int]:
     possible_start_index = search_range[0]
     possible_positions: set[int] = set()
 
     while possible_start_index <= search_range[1]:
-        if is_extended_backward(clued_block, possible_start_index, visible_blocks):
-            possible_start_index += 1
+        if is_extended_backward(clued_block, possible_start_index, line_index):
+            possible_start_index = get_start_after_extending_block(possible_start_index, line_index)
         else:
-            amount_extended_forward = get_amount_extended_forward(clued_block, possible_start_index, visible_blocks)
+            amount_extended_forward = get_amount_extended_forward(clued_block, possible_start_index, line_index)
             if amount_extended_forward > 0:
                 possible_start_index += amount_extended_forward
             else:
-                if not is_on_a_dot(clued_block, possible_start_index, line):
+                last_blank_in_the_way = line_index.last_blank[min(possible_start_index + clued_block.length, line_index.length)]
+                if last_blank_in_the_way < possible_start_index:
                     possible_positions.add(possible_start_index)
-                possible_start_index += 1
+                    possible_start_index += 1
+                else:
+                    possible_start_index = last_blank_in_the_way + 1 # Every start before the dot would sit on it
 
     return possible_positions
 
 
-def get_possible_block_mappings(line: Line) -> dict[VisibleBlock, set[CluedBlock]]:
-    visible_blocks = get_visible_blocks(line)
-    
-    visible_to_clued_block_map: dict[VisibleBlock, set[CluedBlock]] = {}
-    for visible_block in visible_blocks:
-        clued_blocks = get_candidate_clued_blocks(visible_block, line)
-        visible_to_clued_block_map[visible_block] = clued_blocks
+def find_known_blank_regions(line: Line) -> LineChanges:
+    line_changes = _get_blank_line_changes(line)
+    block_limits_list = get_all_naive_limits(line)
 
-    visible_to_clued_block_map = _get_mapping_without_forward_clue_violations(visible_blocks, visible_to_clued_block_map, line)
-    visible_to_clued_block_map = _get_mapping_without_forward_clue_violations(rev_list(visible_blocks), visible_to_clued_block_map, get_reversed_line(line))
+    for square_index in range(len(line.squares)):
+        if not _is_possibly_in_a_clued_block(square_index, block_limits_list):
+            line_changes[square_index] = Square.KNOWN_BLANK
 
-    return visible_to_clued_block_map
+    return line_changes
 
 
-def get_candidate_clued_blocks(visible_block: VisibleBlock, line: Line) -> set[CluedBlock]:
-    candidates: set[CluedBlock] = set()
+# The other algorithms each spot a particular pattern, so they have to take turns until the line stops changing
+# This one is exhaustive: it finds every square that is the same in every valid placement of the clued-blocks
+# fits_before[j][i] says whether the first j clued-blocks can fit in the first i squares, fits_after is the same from the other end
+# Each clued-block position is then valid if the blocks before it fit before it, and the blocks after it fit after it
+# Building the tables and checking the positions are both O(length x clues)
+def check_all_placements(line: Line) -> LineChanges:
+    line_changes = _get_blank_line_changes(line)
+    squares = get_line_squares(line)
+    line_length = len(squares)
+    block_lengths = [clued_block.length for clued_block in line.clued_blocks]
+    block_count = len(block_lengths)
+
+    blanks_before = get_line_index(line).blanks_before
+    fits_before = _get_placement_fits(squares, block_lengths, blanks_before)
+    if not fits_before[block_count][line_length]:
+        raise PuzzleContradiction(f'No placement of the clued-blocks fits this line. {line.orientation.capitalize()} {line.index}')
+
+    # Reversing the line gives us the table from the other end. Blocks j onward fit after square i if the last (count - j) fit in the last (length - i).
+    # Building the table reads each square many times, so here a reversed copy is quicker than a ReversedView
+    # The blanks in the first i squares of the reversed line are the ones in the last i squares of this one
+    blank_count = blanks_before[line_length]
+    reversed_fits = _get_placement_fits(rev_list(squares), rev_list(block_lengths), [blank_count - blanks_before_square for blanks_before_square in reversed(blanks_before)])
+    def fits_after(block_index: int, square_index: int) -> bool:
+        return reversed_fits[block_count - block_index][line_length - square_index]
+
+    # Mark every square covered by some valid block position. A difference array keeps each position O(1).
+    fill_coverage = [0] * (line_length + 1)
+    for block_index, block_length in enumerate(block_lengths):
+        for start in range(line_length - block_length + 1):
+            end = start + block_length # Exclusive
+            if blanks_before[end] - blanks_before[start] > 0:
+                continue
+
+            if start == 0:
+                is_valid_before = fits_before[block_index][0]
+            else:
+                is_valid_before = squares[start - 1] != Square.FILLED and fits_before[block_index][start - 1]
 
-    for clued_block in line.clued_blocks:
-        if visible_block.get_length() <= clued_block.length:
-            clued_block_limits = get_naive_limits(clued_block, line)
-            if visible_block.start >= clued_block_limits[0] and visible_block.end <= clued_block_limits[1]:
-                candidates = candidates | {clued_block}
-
-    return candidates
-
-
-def _get_mapping_without_forward_clue_violations(visible_blocks: list[VisibleBlock], visible_to_clued_block_map: dict[VisibleBlock, set[CluedBlock]], line: Line) -> dict[VisibleBlock, set[CluedBlock]]:
-    # We have to iterate the visible-blocks backwards to remove all invalid mappings
-    # We find invalid mappings by checking if later visible blocks are left with no possible clued-blocks if we remove one
-    # But this won't work if they have multiple invalid clued-block mappings, since removing just one will leave the others
-    for visible_block_index, visible_block in reversed(list(enumerate(visible_blocks))):
-        for clued_block in visible_to_clued_block_map[visible_block]:
-            # Logic: If this visible-block is this clued-block, all later visible blocks cannot be it, or any preceding clued-blocks
-            # If this leaves them with no candidate clued-blocks, it's impossible that this visible-block is this clued-block
-            preceding_clued_blocks = set(get_preceding_clued_blocks(clued_block, line))
-            clued_blocks_to_check = preceding_clued_blocks | {clued_block}
-            for later_visible_block in visible_blocks[visible_block_index + 1:]:
-                # Special case: this clued-block could span both these visible blocks
-                if clued_block in visible_to_clued_block_map[later_visible_block]:
-                    # The if already checks if this clued-block's limits include both visible-blocks
-                    span = get_span([visible_block, later_visible_block])
-                    if clued_block.length >= span:
-                        continue # Move on to next later-visible-block
-
-                if len(visible_to_clued_block_map[later_visible_block] - clued_blocks_to_check) == 0:
-                    # We now modifying a set we are iterating over, which is sus. But testing indicates it works fine.
-                    visible_to_clued_block_map[visible_block] = visible_to_clued_block_map[visible_block] - {clued_block}
-
-    return visible_to_clued_block_map
+            if end == line_length:
+                is_valid_after = fits_after(block_index + 1, line_length)
+            else:
+                is_valid_after = squares[end] != Square.FILLED and fits_after(block_index + 1, end + 1)
 
+            if is_valid_before and is_valid_after:
+                fill_coverage[start] += 1
+                fill_coverage[end] -= 1
 
-def find_known_blank_regions(line: Line) -> LineChanges:
-    line_changes = _get_blank_line_changes(line)
-    block_limits_list = [get_naive_limits(clued_block, line) for clued_block in line.clued_blocks]
+    coverage = 0
+    for square_index, square in enumerate(squares):
+        coverage += fill_coverage[square_index]
+        if square != Square.UNKNOWN:
+            continue
 
-    for square_index, _ in enumerate(line_changes):
-        if not _is_possibly_in_a_clued_block(square_index, block_limits_list):
+        if coverage == 0:
             line_changes[square_index] = Square.KNOWN_BLANK
+        elif not _can_be_blank(square_index, fits_before, fits_after, block_count):
+            line_changes[square_index] = Square.FILLED
 
     return line_changes
 
 
+# The cheap pattern-spotting algorithms go first, and check_all_placements mops up whatever they can't find
+default_line_algorithm_list: list[LineAlgorithm] = [check_overlaps, check_edge_hints, check_possible_visible_clued_mappings, find_known_blank_regions, check_all_placements]
+
+
 # This is redundant now that check_possible_visible_clued_mappings finds dot regions
 # def fill_in_finished_line(line: Line) -> LineChanges:
 #     line_changes = _get_blank_line_changes(line)
@@ -314,14 +325,54 @@ def _is_possibly_in_a_clued_block(square_index: int, block_limits_list: list[tup
     return False
 
 
+# fits[j][i] is True if the first j blocks can be placed in the first i squares, without leaving any filled square uncovered
+# blanks_before[i] is how many dots there are in the first i squares (see LineIndex)
+def _get_placement_fits(squares: list[Square], block_lengths: list[int], blanks_before: list[int]) -> list[list[bool]]:
+    line_length = len(squares)
+
+    no_blocks_fit = [True] * (line_length + 1)
+    for square_index, square in enumerate(squares):
+        no_blocks_fit[square_index + 1] = no_blocks_fit[square_index] and square != Square.FILLED
+    fits = [no_blocks_fit]
+
+    for block_length in block_lengths:
+        previous_fits = fits[-1]
+        current_fits = [False] * (line_length + 1)
+        for end in range(1, line_length + 1):
+            # Either the last square is blank, and everything fits before it...
+            if squares[end - 1] != Square.FILLED and current_fits[end - 1]:
+                current_fits[end] = True
+                continue
+
+            # ...or this block ends on the last square, with a gap before it for the earlier blocks
+            start = end - block_length
+            if start < 0 or blanks_before[end] - blanks_before[start] > 0:
+                continue
+            if start == 0:
+                current_fits[end] = previous_fits[0]
+            else:
+                current_fits[end] = squares[start - 1] != Square.FILLED and previous_fits[start - 1]
+
+        fits.append(current_fits)
+
+    return fits
+
+
+def _can_be_blank(square_index: int, fits_before: list[list[bool]], fits_after: Callable[[int, int], bool], block_count: int) -> bool:
+    for block_index in range(block_count + 1):
+        if fits_before[block_index][square_index] and fits_after(block_index, square_index + 1):
+            return True
+    return False
+
+
 def _get_blank_line_changes(line: Line) -> LineChanges:
-    return [Square.UNKNOWN] * len(line.squares)
+    return LineChanges(len(line.squares))
 
 
 def _surround_with_known_blanks(line_changes:LineChanges, start: int, end: int) -> None:
     if start > 0:
         line_changes[start - 1] = Square.KNOWN_BLANK
-    if end < len(line_changes) - 1:
+    if end < line_changes.length - 1:
         line_changes[end + 1] = Square.KNOWN_BLANK
 
 
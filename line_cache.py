@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from functools import wraps
+from data_classes import EncodedLine, Line, LineChanges, encode_line
+from line_algorithms import LineAlgorithm
+
+
+# The same clues over the same partial line come up again and again: across rounds, between rows and columns
+# with identical clues, and between puzzles in a batch. A LineAlgorithm only looks at the clue lengths and the squares,
+# so we can remember what it said last time and skip straight to the answer. The encoded line makes a compact key.
+
+
+class LineResultCache:
+    max_size: int
+    hits: int
+    misses: int
+
+
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Least recently used results sit at the front, so evicting is just popping the first item
+        self._results: OrderedDict[tuple[LineAlgorithm, EncodedLine], LineChanges] = OrderedDict()
+
+
+    # Wrapped algorithms can go straight into a line_algorithm_list. One cache can be shared by several algorithms.
+    def wrap(self, line_algorithm: LineAlgorithm) -> LineAlgorithm:
+        @wraps(line_algorithm)
+        def cached_line_algorithm(line: Line) -> LineChanges:
+            key = (line_algorithm, encode_line(line))
+            line_changes = self._results.get(key)
+
+            if line_changes is not None:
+                self.hits += 1
+                self._results.move_to_end(key)
+            else:
+                self.misses += 1
+                line_changes = line_algorithm(line)
+                self._results[key] = line_changes
+                if len(self._results) > self.max_size:
+                    self._results.popitem(last=False)
+
+            # Hand out a copy, so nobody can change what we've stored
+            return line_changes.copy()
+
+        return cached_line_algorithm
+
+
+    def clear(self) -> None:
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+    def __len__(self) -> int:
+        return len(self._results)
@@ -1,54 +1,123 @@
-from example_hanjies import tabled as puzzle
-from line_algorithms import LineAlgorithm, LineChanges, check_possible_visible_clued_mappings, check_overlaps, check_edge_hints, find_known_blank_regions
-from square import Square
-from visualise_pygame import PygamePuzzleVisualiser
+from checkpoint import load_checkpoint
+from example_hanjies import tabled
+from instrumentation import SolverProfiler
+from line_algorithms import LineAlgorithm, default_line_algorithm_list
+from line_cache import LineResultCache
+from puzzle_files import load_puzzle
+from solver import CancellationToken, PuzzleSolver, solve_puzzle
+from visualise_terminal import TerminalPuzzleRenderer, visualise_puzzle
+import argparse
 import multiprocessing as mp
+import os
+import signal
 
 
-def has_changes(line_changes: LineChanges, line_squares: list[Square]) -> bool:
-    for square_index, new_value in enumerate(line_changes):
-        if new_value != Square.UNKNOWN and line_squares[square_index] != new_value:
-            return True
-
-    return False
+# Solves headless by default: no pygame, no display process, nothing to wait for. Run with --gui to watch it solve, or --terminal to watch in the terminal.
+# Run with --adaptive to let the solver reorder the algorithms by how much they find for the time they take
+# Run with --checkpoint to save progress to a file every so often, and add --resume to carry on from it if it's there
+# Run with --time-limit, --max-rounds or --max-line-evaluations to stop early and print however much got solved. Ctrl-C does the same.
+# Run with --progress-interval to print how it's getting on every so many seconds
+# Run with --profile to time every line algorithm, and --profile-lines to split that up by line as well
+# The results go to profile.json and profile.folded (collapsed stacks, for flamegraph.pl or speedscope)
+profile_json_path = 'profile.json'
+profile_stacks_path = 'profile.folded'
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Solve a hanjie')
+    parser.add_argument('puzzle_path', nargs='?', help='A puzzle file to solve (.json, .jsonl, .non or .hjb), instead of the example')
+    parser.add_argument('--gui', action='store_true', help='Show the puzzle being solved in a pygame window')
+    parser.add_argument('--terminal', action='store_true', help='Show the puzzle being solved in the terminal')
+    parser.add_argument('--adaptive', action='store_true', help='Reorder the line algorithms by how much they find for the time they take')
+    parser.add_argument('--max-probes', type=int, default=0, help='Guesses to try if the line algorithms get stuck')
+    parser.add_argument('--checkpoint', help='Where to save progress while solving')
+    parser.add_argument('--checkpoint-interval', type=float, default=60.0, help='Seconds between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='Carry on from the checkpoint, if there is one')
+    parser.add_argument('--time-limit', type=float, help='Seconds to stop solving after')
+    parser.add_argument('--max-rounds', type=int, help='Rounds to stop solving after')
+    parser.add_argument('--max-line-evaluations', type=int, help='Line evaluations to stop solving after')
+    parser.add_argument('--progress-interval', type=float, help='Seconds between progress reports')
+    parser.add_argument('--profile', action='store_true', help=f'Time every line algorithm, writing the results to {profile_json_path} and {profile_stacks_path}')
+    parser.add_argument('--profile-lines', action='store_true', help='Like --profile, but split up by line as well')
+    args = parser.parse_args()
+
+    checkpoint = None
+    if args.resume and args.checkpoint is not None and os.path.exists(args.checkpoint):
+        checkpoint = load_checkpoint(args.checkpoint)
+        puzzle = checkpoint.puzzle
+        print(f"Resuming from {args.checkpoint}, after {checkpoint.rounds} rounds")
+    else:
+        puzzle = load_puzzle(args.puzzle_path) if args.puzzle_path is not None else tabled
+
+    visualiser: 'PygamePuzzleVisualiser | TerminalPuzzleRenderer | None' = None
+    display_process = None
+    if args.gui:
+        # Only imported here, so headless runs never pay for loading pygame
+        from visualise_pygame import PygamePuzzleVisualiser
+        visualiser = PygamePuzzleVisualiser(puzzle)
+        display_process = visualiser.display_process
+    elif args.terminal:
+        visualiser = TerminalPuzzleRenderer(puzzle)
+
+    line_result_cache = LineResultCache()
+    line_algorithm_list: list[LineAlgorithm] = [line_result_cache.wrap(line_algorithm) for line_algorithm in default_line_algorithm_list]
+
+    profiler = None
+    if args.profile or args.profile_lines:
+        profiler = SolverProfiler(per_line=args.profile_lines)
+
+    # Ctrl-C stops the solve rather than the program, so we still get to see the partly solved puzzle. A second Ctrl-C stops the program.
+    cancellation_token = CancellationToken()
+    def cancel_solve(signal_number: int, frame: object) -> None:
+        cancellation_token.cancel()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGINT, cancel_solve)
+
+    print("Solving puzzle...")
 
-    visualiser = PygamePuzzleVisualiser(puzzle)
+    result = solve_puzzle(puzzle, line_algorithm_list, max_probes=args.max_probes, adaptive=args.adaptive, profiler=profiler,
+                          on_change=visualiser.visualise_puzzle if visualiser is not None else None,
+                          checkpoint_path=args.checkpoint, checkpoint_interval=args.checkpoint_interval, checkpoint=checkpoint,
+                          time_limit=args.time_limit, max_rounds=args.max_rounds, max_line_evaluations=args.max_line_evaluations,
+                          cancellation_token=cancellation_token, on_progress=print_progress if args.progress_interval is not None else None,
+                          progress_interval=args.progress_interval or 1.0)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    if visualiser is not None:
+        visualiser.flush(puzzle)
 
-    line_algorithm_list: list[LineAlgorithm] = [check_overlaps, check_edge_hints, check_possible_visible_clued_mappings, find_known_blank_regions]
+    if visualiser is None:
+        print(visualise_puzzle(puzzle))
+    print(f"{stopped_messages[result.status]} in {result.wall_time:.3f}s, {result.rounds} rounds, {result.line_evaluations} line evaluations")
+    print(f"Line result cache: {line_result_cache.hits} hits, {line_result_cache.misses} misses")
 
-    anything_has_changed_this_round = True
-    while anything_has_changed_this_round:
-        anything_has_changed_this_round = False
+    if profiler is not None:
+        profiler.print_summary()
+        profiler.write_json(profile_json_path)
+        profiler.write_collapsed_stacks(profile_stacks_path)
+        print(f"Profile written to {profile_json_path} and {profile_stacks_path}")
 
-        print("Top of puzzle solving loop...")
+    if display_process is not None:
+        print("Done. Joining display process...")
+        display_process.join()
 
-        for line_algorithm in line_algorithm_list:
-            for row_index, row in enumerate(puzzle.get_rows()):
-                algorithm_result = line_algorithm(row)
-                result_causes_changes = has_changes(algorithm_result, row.squares)
-                anything_has_changed_this_round = result_causes_changes or anything_has_changed_this_round
-                if result_causes_changes:
-                    puzzle.apply_line_changes(algorithm_result, row_index=row_index)
-                    visualiser.visualise_puzzle(puzzle)
 
-            for column_index, column in enumerate(puzzle.get_columns()):
-                algorithm_result = line_algorithm(column)
-                result_causes_changes = has_changes(algorithm_result, column.squares)
-                anything_has_changed_this_round = result_causes_changes or anything_has_changed_this_round
-                if result_causes_changes:
-                    puzzle.apply_line_changes(algorithm_result, column_index=column_index)
-                    visualiser.visualise_puzzle(puzzle)
+stopped_messages = {
+    'solved': 'Solved',
+    'stuck': 'Got stuck',
+    'deadline': 'Ran out of time',
+    'max_rounds': 'Ran out of rounds',
+    'max_line_evaluations': 'Ran out of line evaluations',
+    'cancelled': 'Cancelled',
+}
 
-    print("Done. Joining display process...")
 
-    visualiser.display_process.join()
+def print_progress(solver: PuzzleSolver) -> None:
+    puzzle = solver.puzzle
+    known_squares = sum((filled_mask | blank_mask).bit_count() for filled_mask, blank_mask in map(puzzle.get_row_masks, range(puzzle.num_rows)))
+    print(f"{known_squares}/{puzzle.num_rows * puzzle.num_columns} squares known after {solver.rounds} rounds, {solver.line_evaluations} line evaluations")
 
 
 # I'm using a second process to run the pygame visualiser. Getting that to work has required this:
 if __name__ == '__main__':
-    print("Setting process start method")
     mp.set_start_method('spawn')
     main()
\ No newline at end of file
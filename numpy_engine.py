@@ -0,0 +1,260 @@
+from typing import Callable
+import numpy as np
+from data_classes import CluedBlock, PuzzleContradiction
+from puzzle import Puzzle
+from square import Square
+
+
+# The line algorithms work on one line at a time, in Python loops over Squares
+# That's fine for the puzzles in books, but for grids hundreds or thousands of squares across we want to do the deductions
+# for every row at once, then for every column at once via the transpose
+# This engine does check_overlaps, check_edge_hints and find_known_blank_regions that way, giving the same results as those functions
+# It doesn't know the cleverer deductions, so it's best used to get a big grid most of the way, before a PuzzleSolver finishes it off
+# It needs numpy, which nothing else in the solver does, so only import this module if you want it
+
+# The grid is a 2D int8 array of these codes
+UNKNOWN = 0
+FILLED = 1
+KNOWN_BLANK = 2
+
+square_codes = {Square.UNKNOWN: UNKNOWN, Square.FILLED: FILLED, Square.KNOWN_BLANK: KNOWN_BLANK}
+squares_by_code = [Square.UNKNOWN, Square.FILLED, Square.KNOWN_BLANK]
+
+
+# The clues for a set of lines, padded into a matrix so we can index them all at once
+class ClueMatrix:
+    counts: np.ndarray           # Number of clues in each line
+    lengths: np.ndarray          # lengths[line, j] is the length of clue j, or 0 past the end of the line's clues
+    reversed_lengths: np.ndarray # The same, but with each line's clues in reverse order
+
+
+    def __init__(self, line_clues: list[list[CluedBlock]]) -> None:
+        max_clue_count = max([len(clued_blocks) for clued_blocks in line_clues] + [1])
+        self.counts = np.array([len(clued_blocks) for clued_blocks in line_clues], dtype=np.int64)
+        self.lengths = np.zeros((len(line_clues), max_clue_count), dtype=np.int64)
+        for line_index, clued_blocks in enumerate(line_clues):
+            self.lengths[line_index, :len(clued_blocks)] = [clued_block.length for clued_block in clued_blocks]
+
+        reversed_indices = self.counts[:, None] - 1 - np.arange(max_clue_count)
+        self.reversed_lengths = np.where(reversed_indices >= 0, np.take_along_axis(self.lengths, np.maximum(reversed_indices, 0), axis=1), 0)
+
+
+    def is_clue(self) -> np.ndarray:
+        return np.arange(self.lengths.shape[1]) < self.counts[:, None]
+
+
+type BatchDeduction = Callable[[np.ndarray, ClueMatrix], np.ndarray]
+
+
+# ======================== Batch deductions ========================
+# Each takes a 2D array of lines and their clues, and returns an array of changes, like a LineChanges per line
+
+
+def get_naive_limits_batch(grid: np.ndarray, clues: ClueMatrix) -> tuple[np.ndarray, np.ndarray]:
+    line_length = grid.shape[1]
+    min_starts = _get_min_starts_batch(grid, clues.lengths, clues.counts)
+
+    # Max-ends are min-starts of the reversed line, with the clues reversed too
+    reversed_min_starts = _get_min_starts_batch(grid[:, ::-1], clues.reversed_lengths, clues.counts)
+    reversed_indices = np.maximum(clues.counts[:, None] - 1 - np.arange(clues.lengths.shape[1]), 0)
+    max_ends = line_length - 1 - np.take_along_axis(reversed_min_starts, reversed_indices, axis=1)
+
+    return (min_starts, max_ends)
+
+
+def check_overlaps_batch(grid: np.ndarray, clues: ClueMatrix) -> np.ndarray:
+    line_count, line_length = grid.shape
+    min_starts, max_ends = get_naive_limits_batch(grid, clues)
+    max_starts = max_ends - clues.lengths + 1
+    min_ends = min_starts + clues.lengths - 1
+    is_found = clues.is_clue() & (min_ends >= max_starts)
+
+    fills = _get_coverage(line_count, line_length, max_starts, min_ends, is_found) > 0
+
+    # Blocks we've found the whole of get a dot either side
+    is_complete = is_found & (min_ends - max_starts + 1 == clues.lengths)
+    dots = np.zeros((line_count, line_length), dtype=bool)
+    _scatter(dots, max_starts - 1, is_complete & (max_starts > 0))
+    _scatter(dots, min_ends + 1, is_complete & (min_ends < line_length - 1))
+
+    line_changes = np.zeros((line_count, line_length), dtype=np.int8)
+    line_changes[dots] = KNOWN_BLANK
+    line_changes[fills] = FILLED
+    return line_changes
+
+
+def check_edge_hints_batch(grid: np.ndarray, clues: ClueMatrix) -> np.ndarray:
+    line_count, line_length = grid.shape
+    line_changes = np.zeros((line_count, line_length), dtype=np.int8)
+    filled = grid == FILLED
+    square_indices = np.arange(line_length)
+    has_clues = clues.counts > 0
+    has_filled = filled.any(axis=1)
+
+    # A filled square within the first block's length of the start must be part of it, and so must everything up to its length
+    first_length = clues.lengths[:, 0]
+    first_filled_index = np.argmax(filled, axis=1)
+    is_first_hint = has_clues & has_filled & (first_filled_index < first_length)
+    first_fills = is_first_hint[:, None] & (square_indices >= first_filled_index[:, None]) & (square_indices < first_length[:, None])
+    line_changes[first_fills & ~filled] = FILLED
+    _scatter_value(line_changes, first_length, is_first_hint & (first_filled_index == 0) & (first_length < line_length), KNOWN_BLANK)
+
+    # And the same from the other end
+    last_length = np.take_along_axis(clues.lengths, np.maximum(clues.counts - 1, 0)[:, None], axis=1)[:, 0]
+    subline_start = line_length - last_length
+    last_filled_index = line_length - 1 - np.argmax(filled[:, ::-1], axis=1)
+    is_last_hint = has_clues & has_filled & (last_filled_index >= subline_start)
+    last_fills = is_last_hint[:, None] & (square_indices >= subline_start[:, None]) & (square_indices < last_filled_index[:, None])
+    line_changes[last_fills & ~filled] = FILLED
+    _scatter_value(line_changes, subline_start - 1, is_last_hint & (last_filled_index == line_length - 1) & (subline_start > 0), KNOWN_BLANK)
+
+    return line_changes
+
+
+def find_known_blank_regions_batch(grid: np.ndarray, clues: ClueMatrix) -> np.ndarray:
+    line_count, line_length = grid.shape
+    min_starts, max_ends = get_naive_limits_batch(grid, clues)
+    coverage = _get_coverage(line_count, line_length, min_starts, max_ends, clues.is_clue())
+
+    line_changes = np.zeros((line_count, line_length), dtype=np.int8)
+    line_changes[coverage == 0] = KNOWN_BLANK
+    return line_changes
+
+
+batch_deduction_list: list[BatchDeduction] = [check_overlaps_batch, check_edge_hints_batch, find_known_blank_regions_batch]
+
+
+# ============================= Engine =============================
+
+
+class NumpyBatchEngine:
+    puzzle: Puzzle
+    grid: np.ndarray
+    rounds: int
+
+
+    def __init__(self, puzzle: Puzzle) -> None:
+        self.puzzle = puzzle
+        self.grid = get_grid(puzzle)
+        self.rounds = 0
+        self._row_clues = ClueMatrix(puzzle.row_clues)
+        self._column_clues = ClueMatrix(puzzle.column_clues)
+
+
+    # Runs every deduction over every row, then every column, until nothing changes, then copies the results into the puzzle
+    def solve(self) -> None:
+        anything_has_changed_this_round = True
+        while anything_has_changed_this_round:
+            self.rounds += 1
+            anything_has_changed_this_round = self._run_deductions(self.grid, self._row_clues)
+            # The transpose is a view, so changes to it land in self.grid
+            anything_has_changed_this_round = self._run_deductions(self.grid.T, self._column_clues) or anything_has_changed_this_round
+
+        for row_index in range(self.puzzle.num_rows):
+            row_codes = self.grid[row_index].tolist()
+            self.puzzle.apply_line_changes({column_index: squares_by_code[code] for column_index, code in enumerate(row_codes) if code != UNKNOWN}, row_index=row_index)
+
+
+    def _run_deductions(self, lines: np.ndarray, clues: ClueMatrix) -> bool:
+        anything_has_changed = False
+
+        for batch_deduction in batch_deduction_list:
+            line_changes = batch_deduction(lines, clues)
+            is_new = (line_changes != UNKNOWN) & (line_changes != lines)
+            if not is_new.any():
+                continue
+
+            conflicts = np.argwhere(is_new & (lines != UNKNOWN))
+            if len(conflicts) > 0:
+                line_index, square_index = conflicts[0]
+                raise PuzzleContradiction(f'{batch_deduction.__name__} tried to overwrite a square with a different value. Line {line_index}, square {square_index}')
+
+            lines[is_new] = line_changes[is_new]
+            anything_has_changed = True
+
+        return anything_has_changed
+
+
+def get_grid(puzzle: Puzzle) -> np.ndarray:
+    grid = np.zeros((puzzle.num_rows, puzzle.num_columns), dtype=np.int8)
+    for row_index in range(puzzle.num_rows):
+        filled_mask, blank_mask = puzzle.get_row_masks(row_index)
+        grid[row_index] = _unpack_mask(filled_mask, puzzle.num_columns) * FILLED + _unpack_mask(blank_mask, puzzle.num_columns) * KNOWN_BLANK
+    return grid
+
+
+# ======================== Private Functions =======================
+
+
+# Follows block_utils._get_all_min_starts for every line at once. Each line creeps its block forward until it settles, same as
+# _get_next_possible_start_for_block, and the lines that settle early just wait for the rest.
+def _get_min_starts_batch(grid: np.ndarray, lengths: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    line_count, line_length = grid.shape
+    line_indices = np.arange(line_count)
+    square_indices = np.arange(line_length)
+    filled = grid == FILLED
+
+    # last_blank[i] is the index of the last dot at or before i. next_unfilled[i] is the first non-filled square at or after i.
+    last_blank = np.maximum.accumulate(np.where(grid == KNOWN_BLANK, square_indices, -1), axis=1)
+    next_unfilled = np.minimum.accumulate(np.where(filled, line_length, square_indices)[:, ::-1], axis=1)[:, ::-1]
+
+    def lookup(table: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        return table[line_indices, np.clip(indices, 0, line_length - 1)]
+
+    min_starts = np.zeros(lengths.shape, dtype=np.int64)
+    possible_starts = np.zeros(line_count, dtype=np.int64)
+
+    for block_index in range(lengths.shape[1]):
+        block_lengths = lengths[:, block_index]
+        is_settling = block_index < counts
+        if (is_settling & (possible_starts >= line_length)).any():
+            raise PuzzleContradiction("Couldn't fit this CluedBlock anywhere!")
+
+        while is_settling.any():
+            # Jump past the last dot under the block
+            window_end = np.minimum(possible_starts + block_lengths, line_length) - 1
+            dot_index = lookup(last_blank, window_end)
+            is_on_dot = is_settling & (window_end >= possible_starts) & (dot_index >= possible_starts)
+            possible_starts = np.where(is_on_dot, dot_index + 1, possible_starts)
+
+            # Off the dots, a touching visible-block drags us forward, and one behind us means we have to creep on
+            is_clear = is_settling & ~is_on_dot
+            index_after = possible_starts + block_lengths
+            is_extended_forward = is_clear & (index_after < line_length) & lookup(filled, index_after)
+            possible_starts = np.where(is_extended_forward, lookup(next_unfilled, index_after) - block_lengths, possible_starts)
+
+            index_before = possible_starts - 1
+            is_extended_backward = is_clear & (index_before >= 0) & (index_before < line_length) & lookup(filled, index_before)
+            possible_starts = np.where(is_extended_backward, possible_starts + 1, possible_starts)
+            if (is_extended_backward & (possible_starts >= line_length)).any():
+                raise PuzzleContradiction("Couldn't fit this CluedBlock anywhere!")
+
+            is_settling = is_settling & ~(is_clear & ~is_extended_backward)
+
+        min_starts[:, block_index] = possible_starts
+        possible_starts = np.where(block_index < counts, possible_starts + block_lengths + 1, possible_starts)
+
+    return min_starts
+
+
+# How many of the ranges [starts, ends] cover each square. Only ranges where include is True count.
+def _get_coverage(line_count: int, line_length: int, starts: np.ndarray, ends: np.ndarray, include: np.ndarray) -> np.ndarray:
+    differences = np.zeros((line_count, line_length + 1), dtype=np.int64)
+    line_indices = np.broadcast_to(np.arange(line_count)[:, None], starts.shape)
+    np.add.at(differences, (line_indices[include], np.clip(starts[include], 0, line_length)), 1)
+    np.add.at(differences, (line_indices[include], np.clip(ends[include] + 1, 0, line_length)), -1)
+    return np.cumsum(differences, axis=1)[:, :line_length]
+
+
+def _scatter(target: np.ndarray, indices: np.ndarray, include: np.ndarray) -> None:
+    line_indices = np.broadcast_to(np.arange(target.shape[0])[:, None], indices.shape)
+    target[line_indices[include], indices[include]] = True
+
+
+def _scatter_value(target: np.ndarray, indices: np.ndarray, include: np.ndarray, value: int) -> None:
+    target[np.arange(target.shape[0])[include], indices[include]] = value
+
+
+def _unpack_mask(mask: int, length: int) -> np.ndarray:
+    mask_bytes = mask.to_bytes((length + 7) // 8, 'little')
+    return np.unpackbits(np.frombuffer(mask_bytes, dtype=np.uint8), bitorder='little')[:length].astype(np.int8)
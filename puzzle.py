@@ -1,57 +1,151 @@
-from data_classes import CluedBlock, Line
-from square import Square
+from data_classes import CluedBlock, Line, PuzzleContradiction, SquaresView
+from square import Square, decode_squares, transpose_masks
 
 
 class Puzzle:
-    _row_squares: list[list[Square]]
+    num_rows: int
+    num_columns: int
     row_clues: list[list[CluedBlock]]
     column_clues: list[list[CluedBlock]]
 
+    # Each line is stored as a pair of bitmasks (see encode_squares), so a square costs a couple of bits rather than a pointer
+    # We keep both a row-major and a column-major copy, kept in sync by _set_square, so reading a column never has to visit every row
+    _row_filled: list[int]
+    _row_blank: list[int]
+    _column_filled: list[int]
+    _column_blank: list[int]
+
+    # One Line per row and column, made once, whose squares are views onto the masks above (see SquaresView)
+    # The mask lists are only ever changed in place, so the views never go stale. A Line's analysis does though, so we drop it when its squares change.
+    _rows: list[Line]
+    _columns: list[Line]
+
 
     def __init__(self, num_rows: int, num_columns: int, row_clues: list[list[int]], column_clues: list[list[int]]) -> None:
+        self.num_rows = num_rows
+        self.num_columns = num_columns
         self.row_clues = [[CluedBlock(length, index) for index, length in enumerate(line_clues)] for line_clues in row_clues]
         self.column_clues = [[CluedBlock(length, index) for index, length in enumerate(line_clues)] for line_clues in column_clues]
 
-        # don't use [[] * c] * r, this will make all the rows be the same list
-        self._row_squares = [[Square.UNKNOWN] * num_columns for _ in range(num_rows)]
+        self._row_filled = [0] * num_rows
+        self._row_blank = [0] * num_rows
+        self._column_filled = [0] * num_columns
+        self._column_blank = [0] * num_columns
+        self._make_lines()
+
+
+    def _make_lines(self) -> None:
+        self._rows = [Line(self.row_clues[row_index], SquaresView(self, self._row_filled, self._row_blank, 'row', row_index, self.num_columns), row_index, 'row', False)
+                      for row_index in range(self.num_rows)]
+        self._columns = [Line(self.column_clues[column_index], SquaresView(self, self._column_filled, self._column_blank, 'column', column_index, self.num_rows), column_index, 'column', False)
+                         for column_index in range(self.num_columns)]
 
 
     def get_rows(self) -> list[Line]:
-        return [self.get_row(row_index) for row_index, _ in enumerate(self._row_squares)]
+        return list(self._rows)
 
     def get_columns(self) -> list[Line]:
-        return [self.get_column(column_index) for column_index, _ in enumerate(self._row_squares[0])]
+        return list(self._columns)
 
 
+    # These are live: the Line's squares follow the puzzle as it changes. Copy them (list(line.squares)) to keep a snapshot.
     def get_row(self, row_index: int) -> Line:
-        return Line(self.row_clues[row_index], self._row_squares[row_index], row_index, 'row', False)
+        return self._rows[row_index]
 
 
     def get_column(self, column_index: int) -> Line:
-        return Line(self.column_clues[column_index], self._get_column_squares(column_index), column_index, 'column', False)
+        return self._columns[column_index]
+
+
+    def get_row_squares(self, row_index: int) -> list[Square]:
+        return decode_squares(self._row_filled[row_index], self._row_blank[row_index], self.num_columns)
+
+
+    def get_column_squares(self, column_index: int) -> list[Square]:
+        return decode_squares(self._column_filled[column_index], self._column_blank[column_index], self.num_rows)
+
+
+    def copy(self) -> 'Puzzle':
+        # The clues never change, so the copy can share them
+        puzzle_copy = Puzzle(0, 0, [], [])
+        puzzle_copy.num_rows = self.num_rows
+        puzzle_copy.num_columns = self.num_columns
+        puzzle_copy.row_clues = self.row_clues
+        puzzle_copy.column_clues = self.column_clues
+        puzzle_copy._row_filled = list(self._row_filled)
+        puzzle_copy._row_blank = list(self._row_blank)
+        puzzle_copy._column_filled = list(self._column_filled)
+        puzzle_copy._column_blank = list(self._column_blank)
+        puzzle_copy._make_lines()
+        return puzzle_copy
+
+
+    def is_complete(self) -> bool:
+        # Every square in a complete row has one of its bits set
+        full_row_mask = (1 << self.num_columns) - 1
+        return all(self._row_filled[row_index] | self._row_blank[row_index] == full_row_mask for row_index in range(self.num_rows))
 
 
-    def apply_line_changes(self, changes: list[Square], *, row_index: int|None = None, column_index: int|None = None) -> None:
+    def get_row_masks(self, row_index: int) -> tuple[int, int]:
+        return (self._row_filled[row_index], self._row_blank[row_index])
+
+
+    def get_column_masks(self, column_index: int) -> tuple[int, int]:
+        return (self._column_filled[column_index], self._column_blank[column_index])
+
+
+    # Replaces every square at once, e.g. when resuming from a checkpoint. The masks are one filled and one blank mask per row, like get_row_masks.
+    def set_row_masks(self, row_filled: list[int], row_blank: list[int]) -> None:
+        full_row_mask = (1 << self.num_columns) - 1
+        if len(row_filled) != self.num_rows or len(row_blank) != self.num_rows:
+            raise Exception(f'Expected masks for {self.num_rows} rows, got {len(row_filled)} filled and {len(row_blank)} blank')
+        for row_index, (filled_mask, blank_mask) in enumerate(zip(row_filled, row_blank)):
+            if filled_mask & blank_mask or (filled_mask | blank_mask) & ~full_row_mask:
+                raise Exception(f'Row {row_index} has squares that are both filled and blank, or are off the end of the row')
+
+        self._row_filled[:] = row_filled
+        self._row_blank[:] = row_blank
+        self._column_filled[:] = transpose_masks(self._row_filled, self.num_columns)
+        self._column_blank[:] = transpose_masks(self._row_blank, self.num_columns)
+        for line in self._rows + self._columns:
+            line.analysis = None
+
+
+    def get_square(self, row_index: int, column_index: int) -> Square:
+        if self._row_filled[row_index] >> column_index & 1:
+            return Square.FILLED
+        if self._row_blank[row_index] >> column_index & 1:
+            return Square.KNOWN_BLANK
+        return Square.UNKNOWN
+
+
+    # Changes are square index -> new value, like a LineChanges, so this only costs as much as the number of changes
+    def apply_line_changes(self, changes: dict[int, Square], *, row_index: int|None = None, column_index: int|None = None) -> None:
         if row_index != None and column_index != None:
             raise Exception('Only try to change one row or column at a time')
         
         if row_index != None:
-            for square_index, new_value in enumerate(changes):
+            for square_index, new_value in changes.items():
                 if new_value != Square.UNKNOWN:
                     self._set_square(row_index, square_index, new_value)
         
         if column_index != None:
-            for square_index, new_value in enumerate(changes):
+            for square_index, new_value in changes.items():
                 if new_value != Square.UNKNOWN:
                     self._set_square(square_index, column_index, new_value)
 
 
     def _set_square(self, row_index: int, column_index: int, new_value: Square) -> None:
-        current_value = self._row_squares[row_index][column_index]
+        current_value = self.get_square(row_index, column_index)
         if current_value != new_value and current_value != Square.UNKNOWN:
-            raise Exception(f'Tried to overwrite a square with a different value ({current_value.get_grid_char()} -> {new_value.get_grid_char()}). Row {row_index}, column {column_index}')
-        self._row_squares[row_index][column_index] = new_value
-
-
-    def _get_column_squares(self, column_index: int) -> list[Square]:
-        return [row[column_index] for row in self._row_squares]
+            raise PuzzleContradiction(f'Tried to overwrite a square with a different value ({current_value.get_grid_char()} -> {new_value.get_grid_char()}). Row {row_index}, column {column_index}')
+
+        if new_value == Square.FILLED:
+            self._row_filled[row_index] |= 1 << column_index
+            self._column_filled[column_index] |= 1 << row_index
+        elif new_value == Square.KNOWN_BLANK:
+            self._row_blank[row_index] |= 1 << column_index
+            self._column_blank[column_index] |= 1 << row_index
+        if current_value != new_value:
+            self._rows[row_index].analysis = None
+            self._columns[column_index].analysis = None
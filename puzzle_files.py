@@ -0,0 +1,213 @@
+from typing import Callable, Iterable, Iterator
+import json
+import os
+from puzzle import Puzzle
+
+
+# Loads puzzles from files, so we aren't limited to the ones typed into example_hanjies.py
+# Every format reads as a stream of PuzzleClues, one puzzle at a time, so a file with thousands of puzzles never has to sit in memory as Puzzles
+# Building the Puzzle is left to whoever needs it, since that's the slow part (see iter_puzzles)
+#
+#   .json   One puzzle, or a list of them: {"rows": [[1], [3], [5], [1, 1], [1, 1]], "columns": [[3], [2], [3], [2], [3]]}
+#           Clues are listed from the top row down and the left column across
+#   .jsonl  One JSON puzzle per line, read a line at a time
+#   .non    The common text format: 'width' and 'height' lines, then 'rows' and 'columns' sections with a line of comma-separated clues
+#           for each row or column ('0' or nothing for an empty line). Anything else, like 'title' or 'goal', is ignored.
+#   .hjb    Our own binary format, see below. By far the quickest to load.
+
+type PuzzleClues = tuple[list[list[int]], list[list[int]]] # (row clues, column clues)
+
+
+def load_puzzle(path: str) -> Puzzle:
+    for puzzle in iter_puzzles(path):
+        return puzzle
+    raise Exception(f'No puzzles in {path}')
+
+
+def iter_puzzles(path: str) -> Iterator[Puzzle]:
+    for row_clues, column_clues in iter_puzzle_clues(path):
+        yield Puzzle(len(row_clues), len(column_clues), row_clues, column_clues)
+
+
+def iter_puzzle_clues(path: str) -> Iterator[PuzzleClues]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in puzzle_loaders:
+        raise Exception(f"Don't know how to load {extension or 'extensionless'} puzzle files: {path}")
+    return puzzle_loaders[extension](path)
+
+
+def iter_json_puzzle_clues(path: str) -> Iterator[PuzzleClues]:
+    with open(path, encoding='utf-8') as puzzle_file:
+        puzzle_json = json.load(puzzle_file)
+    for puzzle_dict in puzzle_json if isinstance(puzzle_json, list) else [puzzle_json]:
+        yield get_dict_clues(puzzle_dict)
+
+
+def iter_json_lines_puzzle_clues(path: str) -> Iterator[PuzzleClues]:
+    with open(path, encoding='utf-8') as puzzle_file:
+        for line in puzzle_file:
+            if line.strip():
+                yield get_dict_clues(json.loads(line))
+
+
+def get_dict_clues(puzzle_dict: dict) -> PuzzleClues:
+    row_clues = puzzle_dict.get('rows')
+    column_clues = puzzle_dict.get('columns')
+    if not isinstance(row_clues, list) or not isinstance(column_clues, list):
+        raise Exception('A puzzle needs a list of row clues and a list of column clues')
+    return (row_clues, column_clues)
+
+
+def puzzle_from_dict(puzzle_dict: dict) -> Puzzle:
+    row_clues, column_clues = get_dict_clues(puzzle_dict)
+    return Puzzle(len(row_clues), len(column_clues), row_clues, column_clues)
+
+
+def iter_non_puzzle_clues(path: str) -> Iterator[PuzzleClues]:
+    with open(path, encoding='utf-8') as puzzle_file:
+        yield read_non_clues(puzzle_file)
+
+
+def read_non_clues(lines: Iterable[str]) -> PuzzleClues:
+    sizes: dict[str, int] = {}
+    sections: dict[str, list[list[int]]] = {}
+    current_section: list[list[int]] | None = None
+    current_section_size = 0
+
+    for line in lines:
+        line = line.strip()
+
+        # A section runs until the next keyword line, since clue lines are nothing but numbers, commas and spaces
+        # Inside it a blank line is a line with no clues, unless the section already has all its lines. Then it's just a gap before the next section.
+        if current_section is not None and not line[:1].isalpha():
+            if line != '' or len(current_section) < current_section_size:
+                current_section.append([int(clue) for clue in line.replace(',', ' ').split() if clue != '0'])
+            continue
+        current_section = None
+
+        words = line.split()
+        if len(words) == 0:
+            continue
+        keyword = words[0].lower()
+        if keyword in ('width', 'height') and len(words) > 1:
+            sizes[keyword] = int(words[1])
+        elif keyword in ('rows', 'columns'):
+            size_keyword = 'height' if keyword == 'rows' else 'width'
+            if size_keyword not in sizes:
+                raise Exception(f"The {keyword} section has to come after the '{size_keyword}' line")
+            current_section = sections[keyword] = []
+            current_section_size = sizes[size_keyword]
+
+    for keyword, size_keyword in (('rows', 'height'), ('columns', 'width')):
+        if keyword not in sections or len(sections[keyword]) != sizes[size_keyword]:
+            raise Exception(f"Expected {sizes.get(size_keyword)} lines of {keyword} clues, found {len(sections.get(keyword, []))}")
+
+    return (sections['rows'], sections['columns'])
+
+
+# The binary format is the magic bytes, then each puzzle one after another:
+#
+#   row count, column count, then for each row and then each column: clue count, followed by the clue lengths
+#
+# Every number is an unsigned LEB128 varint: 7 bits per byte, lowest first, with the top bit set on every byte but the last
+# Clues in real puzzles are almost always under 128, in which case every number is a single byte, and we can skip decoding entirely
+binary_magic = b'HJB1'
+
+
+def write_binary_puzzles(path: str, puzzles: Iterable[Puzzle]) -> None:
+    with open(path, 'wb') as puzzle_file:
+        puzzle_file.write(binary_magic)
+        for puzzle in puzzles:
+            puzzle_file.write(encode_binary_puzzle(puzzle))
+
+
+def encode_binary_puzzle(puzzle: Puzzle) -> bytes:
+    numbers = [puzzle.num_rows, puzzle.num_columns]
+    for line_clues in puzzle.row_clues + puzzle.column_clues:
+        numbers.append(len(line_clues))
+        numbers.extend(clued_block.length for clued_block in line_clues)
+
+    if max(numbers) < 128:
+        return bytes(numbers)
+    return b''.join(_encode_varint(number) for number in numbers)
+
+
+def iter_binary_puzzle_clues(path: str) -> Iterator[PuzzleClues]:
+    with open(path, 'rb') as puzzle_file:
+        data = puzzle_file.read()
+    if data[:len(binary_magic)] != binary_magic:
+        raise Exception(f'Not a binary puzzle file: {path}')
+    position = len(binary_magic)
+
+    if not data.isascii():
+        while position < len(data):
+            puzzle_clues, position = read_binary_puzzle_clues(data, position)
+            yield puzzle_clues
+        return
+
+    # With no byte over 127, every varint is one byte, and a clue list is just a slice of the data
+    data_length = len(data)
+    while position < data_length:
+        try:
+            num_rows, num_columns = data[position], data[position + 1]
+            position += 2
+
+            lines: list[list[int]] = []
+            for _ in range(num_rows + num_columns):
+                clue_end = position + 1 + data[position]
+                lines.append(list(data[position + 1:clue_end]))
+                position = clue_end
+        except IndexError:
+            raise Exception(f'Binary puzzle file ends part way through a puzzle: {path}')
+        if position > data_length:
+            raise Exception(f'Binary puzzle file ends part way through a puzzle: {path}')
+
+        yield (lines[:num_rows], lines[num_rows:])
+
+
+# Reads the puzzle starting at position, and returns its clues and the position just after it
+def read_binary_puzzle_clues(data: bytes, position: int) -> tuple[PuzzleClues, int]:
+    num_rows, position = _read_varint(data, position)
+    num_columns, position = _read_varint(data, position)
+
+    lines: list[list[int]] = []
+    for _ in range(num_rows + num_columns):
+        clue_count, position = _read_varint(data, position)
+        line_clues: list[int] = []
+        for _ in range(clue_count):
+            clue, position = _read_varint(data, position)
+            line_clues.append(clue)
+        lines.append(line_clues)
+
+    return ((lines[:num_rows], lines[num_rows:]), position)
+
+
+def _encode_varint(number: int) -> bytes:
+    varint = bytearray()
+    while number >= 0x80:
+        varint.append(number & 0x7f | 0x80)
+        number >>= 7
+    varint.append(number)
+    return bytes(varint)
+
+
+def _read_varint(data: bytes, position: int) -> tuple[int, int]:
+    number = 0
+    shift = 0
+    while True:
+        if position >= len(data):
+            raise Exception('Binary puzzle data ends part way through a puzzle')
+        byte = data[position]
+        position += 1
+        number |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return (number, position)
+        shift += 7
+
+
+puzzle_loaders: dict[str, Callable[[str], Iterator[PuzzleClues]]] = {
+    '.json': iter_json_puzzle_clues,
+    '.jsonl': iter_json_lines_puzzle_clues,
+    '.non': iter_non_puzzle_clues,
+    '.hjb': iter_binary_puzzle_clues,
+}
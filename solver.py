@@ -0,0 +1,543 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+from typing import TYPE_CHECKING, Callable, Literal, Sequence
+import math
+import os
+import threading
+import time
+from checkpoint import Checkpoint, write_checkpoint
+from data_classes import EncodedLine, Line, LineChanges, PuzzleContradiction, decode_line, encode_line
+from line_algorithms import LineAlgorithm, default_line_algorithm_list
+from puzzle import Puzzle
+from square import Square, encode_squares
+
+if TYPE_CHECKING:
+    from instrumentation import SolverProfiler
+
+
+# Sweeping every line with every algorithm until a whole round changes nothing wastes most of its time
+# Once a line has been looked at, running the same algorithms on it again can only find something new if its squares changed
+# And a line's squares only change when we deduce something about it, or about a line crossing it
+# So we keep a queue of dirty lines: changing a square in a row dirties the column crossing it, and vice versa
+
+type LineId = tuple[str, int] # (orientation, index), orientation being 'row' or 'column' like on Line
+
+# How a solve ended. Every status but 'solved' leaves the puzzle partly solved, with everything deduced so far filled in.
+#   solved                Every square is known
+#   stuck                 The line algorithms (and probing, if allowed) ran out of things to deduce
+#   deadline              Ran out of time
+#   max_rounds            Used up its rounds
+#   max_line_evaluations  Used up its line evaluations
+#   cancelled             Its CancellationToken was cancelled
+type SolveStatus = Literal['solved', 'stuck', 'deadline', 'max_rounds', 'max_line_evaluations', 'cancelled']
+
+
+class DirtyLineQueue:
+    def __init__(self) -> None:
+        # A dict keeps insertion order and has O(1) membership checks, so it makes a decent ordered set
+        self._dirty_lines: dict[LineId, None] = {}
+
+
+    def mark_dirty(self, line_id: LineId) -> None:
+        self._dirty_lines[line_id] = None
+
+
+    def discard(self, line_id: LineId) -> None:
+        self._dirty_lines.pop(line_id, None)
+
+
+    # A round is every line that is dirty right now. Lines dirtied while we work through it go into the next round.
+    def take_round(self) -> list[LineId]:
+        round_line_ids = list(self._dirty_lines)
+        self._dirty_lines.clear()
+        return round_line_ids
+
+
+    def __len__(self) -> int:
+        return len(self._dirty_lines)
+
+
+# With a fixed line_algorithm_list, every algorithm runs on every line we look at, even when a cheap one already found everything there was
+# AdaptiveAlgorithmOrder keeps track of how many squares each algorithm deduces per nanosecond it runs for, and puts the best value first
+# The solver then stops at the first algorithm that deduces something, and only escalates a line to the later (costlier or less useful)
+# algorithms when everything before them has stalled on it. A line still only counts as done once every algorithm has had nothing to say.
+class AdaptiveAlgorithmOrder:
+    line_algorithm_list: list[LineAlgorithm]
+    squares_deduced: dict[LineAlgorithm, int]
+    elapsed_ns: dict[LineAlgorithm, int]
+
+
+    def __init__(self, line_algorithm_list: list[LineAlgorithm]) -> None:
+        self.line_algorithm_list = list(line_algorithm_list)
+        self.squares_deduced = {line_algorithm: 0 for line_algorithm in line_algorithm_list}
+        self.elapsed_ns = {line_algorithm: 0 for line_algorithm in line_algorithm_list}
+
+
+    def record(self, line_algorithm: LineAlgorithm, elapsed_ns: int, squares_deduced: int) -> None:
+        self.elapsed_ns[line_algorithm] += elapsed_ns
+        self.squares_deduced[line_algorithm] += squares_deduced
+
+
+    # Algorithms that haven't run yet go first, so we find out what they're worth. Ties keep the order they were given in.
+    def reorder(self) -> None:
+        self.line_algorithm_list.sort(key=self._get_yield, reverse=True)
+
+
+    def _get_yield(self, line_algorithm: LineAlgorithm) -> float:
+        elapsed_ns = self.elapsed_ns[line_algorithm]
+        if elapsed_ns == 0:
+            return math.inf
+        return self.squares_deduced[line_algorithm] / elapsed_ns
+
+
+# Lets another thread (or a signal handler) ask a solve to stop. The solver notices between lines, and returns what it has so far.
+class CancellationToken:
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+
+    def cancel(self) -> None:
+        self._event.set()
+
+
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+# Some puzzles can't be finished one line at a time. When the line algorithms get stuck, the solver can probe:
+# it guesses a value for an unknown square on a copy of the puzzle, and lets the line algorithms run with it
+# If that leads to a PuzzleContradiction, the guess was wrong, so the square must have the other value
+# Probing is off unless max_probes is set. Each probe gives up after max_probe_line_evaluations, so a stuck puzzle can only cost so much.
+# Set adaptive to let an AdaptiveAlgorithmOrder pick which algorithms to run on each line, and in what order.
+# Pass a SolverProfiler to have every algorithm run timed. Without one, the only cost is checking that it's None before each run.
+# With a checkpoint_path, a checkpoint is written there every checkpoint_interval seconds, and once more when solve finishes
+# on_progress works the same way: it's called with the solver every progress_interval seconds, and once more at the end
+#
+# A solve can be given limits, for when an answer is needed by some time. Once one is hit, solve stops and leaves the puzzle partly solved.
+#   deadline              A time.perf_counter() value to stop at
+#   max_rounds            Rounds to stop after
+#   max_line_evaluations  Line evaluations (probes' included) to stop after
+#   cancellation_token    Stops as soon as it's cancelled
+# The limits are checked between lines, so a solve can run over by as long as one line takes. Rounds and line evaluations count the same way
+# as the stats do, so after restore_counters they include what the earlier solve used. The status says how the solve ended (see SolveStatus).
+class PuzzleSolver:
+    puzzle: Puzzle
+    line_algorithm_list: list[LineAlgorithm]
+    on_change: Callable[[Puzzle], None] | None
+    max_probes: int
+    max_probe_line_evaluations: int
+    rounds: int
+    line_evaluations: int
+    probes: int
+    squares_deduced: dict[str, int] # By algorithm name, with squares fixed by probing under 'probing'
+    profiler: 'SolverProfiler | None'
+    algorithm_order: AdaptiveAlgorithmOrder | None # Only when adaptive
+    checkpoint_path: str | None
+    checkpoint_interval: float
+    deadline: float | None
+    max_rounds: int | None
+    max_line_evaluations: int | None
+    cancellation_token: CancellationToken | None
+    on_progress: 'Callable[[PuzzleSolver], None] | None'
+    progress_interval: float
+    status: SolveStatus | None # None until solve finishes
+    stop_reason: SolveStatus | None # The limit we stopped for, if any
+
+
+    def __init__(self, puzzle: Puzzle, line_algorithm_list: list[LineAlgorithm], on_change: Callable[[Puzzle], None] | None = None,
+                 max_probes: int = 0, max_probe_line_evaluations: int = 1000, profiler: 'SolverProfiler | None' = None, adaptive: bool = False,
+                 checkpoint_path: str | None = None, checkpoint_interval: float = 60.0, deadline: float | None = None, max_rounds: int | None = None,
+                 max_line_evaluations: int | None = None, cancellation_token: CancellationToken | None = None,
+                 on_progress: 'Callable[[PuzzleSolver], None] | None' = None, progress_interval: float = 1.0) -> None:
+        self.puzzle = puzzle
+        self.line_algorithm_list = line_algorithm_list
+        self.on_change = on_change
+        self.max_probes = max_probes
+        self.max_probe_line_evaluations = max_probe_line_evaluations
+        self.profiler = profiler
+        self.algorithm_order = AdaptiveAlgorithmOrder(line_algorithm_list) if adaptive else None
+        self.rounds = 0
+        self.line_evaluations = 0
+        self.probes = 0
+        self.squares_deduced = {line_algorithm.__name__: 0 for line_algorithm in line_algorithm_list}
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self._last_checkpoint_time = time.perf_counter()
+        self.deadline = deadline
+        self.max_rounds = max_rounds
+        self.max_line_evaluations = max_line_evaluations
+        self.cancellation_token = cancellation_token
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self._last_progress_time = time.perf_counter()
+        self.status = None
+        self.stop_reason = None
+        self._queue = DirtyLineQueue()
+
+
+    # Carries on the counts from an earlier solve, so the stats cover the whole thing. The checkpoint's puzzle should be the one we're solving.
+    def restore_counters(self, checkpoint: Checkpoint) -> None:
+        self.rounds = checkpoint.rounds
+        self.line_evaluations = checkpoint.line_evaluations
+        self.probes = checkpoint.probes
+        for algorithm_name, squares_deduced in checkpoint.squares_deduced.items():
+            self.squares_deduced[algorithm_name] = self.squares_deduced.get(algorithm_name, 0) + squares_deduced
+
+
+    def solve(self) -> None:
+        self._mark_all_lines_dirty()
+        self._run_line_algorithms()
+
+        while self.stop_reason is None and self.probes < self.max_probes and not self.puzzle.is_complete():
+            if not self._probe():
+                break # No probe taught us anything, so more of the same won't either
+            self._check_checkpoint()
+            self._check_progress()
+
+        if self.puzzle.is_complete():
+            self.status = 'solved'
+        else:
+            self.status = self.stop_reason or 'stuck'
+
+        if self.checkpoint_path is not None:
+            write_checkpoint(self.checkpoint_path, self)
+        if self.on_progress is not None:
+            self.on_progress(self)
+
+
+    def _check_checkpoint(self) -> None:
+        if self.checkpoint_path is not None and time.perf_counter() - self._last_checkpoint_time >= self.checkpoint_interval:
+            write_checkpoint(self.checkpoint_path, self)
+            self._last_checkpoint_time = time.perf_counter()
+
+
+    def _check_progress(self) -> None:
+        if self.on_progress is not None and time.perf_counter() - self._last_progress_time >= self.progress_interval:
+            self.on_progress(self)
+            self._last_progress_time = time.perf_counter()
+
+
+    # Returns True if one of the limits has been hit, and remembers which in stop_reason. The rounds limit is checked between rounds instead.
+    def _check_limits(self) -> bool:
+        if self.stop_reason is not None:
+            return True
+        if self.cancellation_token is not None and self.cancellation_token.is_cancelled():
+            self.stop_reason = 'cancelled'
+        elif self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.stop_reason = 'deadline'
+        elif self.max_line_evaluations is not None and self.line_evaluations >= self.max_line_evaluations:
+            self.stop_reason = 'max_line_evaluations'
+        return self.stop_reason is not None
+
+
+    def _check_round_limit(self) -> bool:
+        if self.max_rounds is not None and self.rounds >= self.max_rounds:
+            self.stop_reason = 'max_rounds'
+        return self.stop_reason is not None
+
+
+    # Returns False if it gave up because of max_line_evaluations or one of the limits, in which case the unfinished lines are left in the queue
+    def _run_line_algorithms(self, max_line_evaluations: int | None = None) -> bool:
+        while len(self._queue) > 0:
+            if self._check_round_limit():
+                return False
+            self.rounds += 1
+            round_line_ids = self._queue.take_round()
+            if self.algorithm_order is not None:
+                self.algorithm_order.reorder()
+            for round_index, line_id in enumerate(round_line_ids):
+                if (max_line_evaluations is not None and self.line_evaluations >= max_line_evaluations) or self._check_limits():
+                    for unfinished_line_id in round_line_ids[round_index:]:
+                        self._queue.mark_dirty(unfinished_line_id)
+                    return False
+                self._evaluate_line(line_id)
+                self._check_checkpoint()
+                self._check_progress()
+
+        return True
+
+
+    # Tries probes in order of get_probe_candidates, and stops at the first one that fixes a square
+    def _probe(self) -> bool:
+        for row_index, column_index in get_probe_candidates(self.puzzle):
+            for guess, other_value in ((Square.FILLED, Square.KNOWN_BLANK), (Square.KNOWN_BLANK, Square.FILLED)):
+                if self.probes >= self.max_probes or self._check_limits():
+                    return False
+                self.probes += 1
+
+                if self._guess_leads_to_contradiction(row_index, column_index, guess):
+                    self._set_square(row_index, column_index, other_value)
+                    self.squares_deduced['probing'] = self.squares_deduced.get('probing', 0) + 1
+                    self._run_line_algorithms()
+                    return True
+
+        return False
+
+
+    def _guess_leads_to_contradiction(self, row_index: int, column_index: int, guess: Square) -> bool:
+        # Probes share our profiler, since the time they spend in the algorithms is part of what solving costs
+        # They also share our deadline and cancellation token. A probe cut short didn't find a contradiction, so it can't lead us astray.
+        probe_solver = PuzzleSolver(self.puzzle.copy(), self.line_algorithm_list, profiler=self.profiler, deadline=self.deadline,
+                                    cancellation_token=self.cancellation_token)
+        # Probes also share what we've learnt about the algorithms, and add to it
+        probe_solver.algorithm_order = self.algorithm_order
+        max_probe_line_evaluations = self.max_probe_line_evaluations
+        if self.max_line_evaluations is not None:
+            max_probe_line_evaluations = min(max_probe_line_evaluations, self.max_line_evaluations - self.line_evaluations)
+        try:
+            probe_solver._set_square(row_index, column_index, guess)
+            probe_solver._run_line_algorithms(max_probe_line_evaluations)
+        except PuzzleContradiction:
+            return True
+        finally:
+            self.line_evaluations += probe_solver.line_evaluations
+
+        return False
+
+
+    def _set_square(self, row_index: int, column_index: int, new_value: Square) -> None:
+        line_changes = LineChanges(self.puzzle.num_columns)
+        line_changes[column_index] = new_value
+        self._apply_line_changes(('row', row_index), line_changes, [column_index])
+        self._queue.mark_dirty(('row', row_index))
+
+
+    def _evaluate_line(self, line_id: LineId) -> None:
+        # If this line was dirtied again earlier in this round, we're about to see its latest state anyway
+        self._queue.discard(line_id)
+
+        line = self._get_line(line_id)
+        if Square.UNKNOWN not in line.squares:
+            return # Complete lines have nothing left to deduce
+
+        self.line_evaluations += 1
+        line_has_changed = False
+        profiler = self.profiler
+        algorithm_order = self.algorithm_order
+        line_algorithm_list = self.line_algorithm_list if algorithm_order is None else algorithm_order.line_algorithm_list
+
+        for line_algorithm in line_algorithm_list:
+            if profiler is None and algorithm_order is None:
+                algorithm_result = line_algorithm(line)
+                changed_indices = get_changed_indices(algorithm_result, line.squares)
+            else:
+                start_time = time.perf_counter_ns()
+                algorithm_result = line_algorithm(line)
+                elapsed_ns = time.perf_counter_ns() - start_time
+                changed_indices = get_changed_indices(algorithm_result, line.squares)
+                if profiler is not None:
+                    profiler.record(line_algorithm.__name__, line_id, elapsed_ns, len(changed_indices))
+                if algorithm_order is not None:
+                    algorithm_order.record(line_algorithm, elapsed_ns, len(changed_indices))
+
+            if len(changed_indices) > 0:
+                self._apply_line_changes(line_id, algorithm_result, changed_indices)
+                self.squares_deduced[line_algorithm.__name__] += len(changed_indices)
+                line_has_changed = True # No need to get the line again, its squares are a live view of the puzzle
+                if algorithm_order is not None:
+                    break # Don't escalate, the cheaper algorithms get another go at the new squares next round
+
+        # Later algorithms in the list may have taught earlier ones something, so give the line another go next round
+        if line_has_changed:
+            self._queue.mark_dirty(line_id)
+
+
+    def _mark_all_lines_dirty(self) -> None:
+        for row_index in range(self.puzzle.num_rows):
+            self._queue.mark_dirty(('row', row_index))
+        for column_index in range(self.puzzle.num_columns):
+            self._queue.mark_dirty(('column', column_index))
+
+
+    def _apply_line_changes(self, line_id: LineId, line_changes: LineChanges, changed_indices: list[int]) -> None:
+        orientation, line_index = line_id
+        if orientation == 'row':
+            self.puzzle.apply_line_changes(line_changes, row_index=line_index)
+            crossing_orientation = 'column'
+        else:
+            self.puzzle.apply_line_changes(line_changes, column_index=line_index)
+            crossing_orientation = 'row'
+
+        for square_index in changed_indices:
+            self._queue.mark_dirty((crossing_orientation, square_index))
+
+        if self.on_change is not None:
+            self.on_change(self.puzzle)
+
+
+    def _get_line(self, line_id: LineId) -> Line:
+        orientation, line_index = line_id
+        return self.puzzle.get_row(line_index) if orientation == 'row' else self.puzzle.get_column(line_index)
+
+
+@dataclass
+class SolveResult:
+    puzzle: Puzzle
+    complete: bool
+    status: SolveStatus
+    wall_time: float
+    rounds: int
+    line_evaluations: int
+    probes: int
+    squares_deduced: dict[str, int]
+
+
+# The quickest way to solve a puzzle: no display, nothing to set up. Solves the puzzle in place and hands it back with some stats.
+# With a checkpoint_path, progress is saved there as it goes. To pick up from a checkpoint, load it and pass in its puzzle along with it:
+#
+#   checkpoint = load_checkpoint(path)
+#   solve_puzzle(checkpoint.puzzle, checkpoint=checkpoint, checkpoint_path=path)
+#
+# To get an answer within some time, give it a time_limit in seconds. If it runs out, you get back the puzzle as far as it got, with status 'deadline':
+#
+#   result = solve_puzzle(puzzle, time_limit=0.5, on_progress=report, progress_interval=0.1)
+#   if result.status != 'solved': ...
+def solve_puzzle(puzzle: Puzzle, line_algorithm_list: list[LineAlgorithm] | None = None, *, max_probes: int = 0, adaptive: bool = False,
+                 profiler: 'SolverProfiler | None' = None, on_change: Callable[[Puzzle], None] | None = None,
+                 checkpoint_path: str | None = None, checkpoint_interval: float = 60.0, checkpoint: Checkpoint | None = None,
+                 time_limit: float | None = None, max_rounds: int | None = None, max_line_evaluations: int | None = None,
+                 cancellation_token: CancellationToken | None = None, on_progress: Callable[[PuzzleSolver], None] | None = None,
+                 progress_interval: float = 1.0) -> SolveResult:
+    start_time = time.perf_counter()
+    solver = PuzzleSolver(puzzle, line_algorithm_list or default_line_algorithm_list, on_change, max_probes, profiler=profiler, adaptive=adaptive,
+                          checkpoint_path=checkpoint_path, checkpoint_interval=checkpoint_interval,
+                          deadline=start_time + time_limit if time_limit is not None else None, max_rounds=max_rounds,
+                          max_line_evaluations=max_line_evaluations, cancellation_token=cancellation_token,
+                          on_progress=on_progress, progress_interval=progress_interval)
+    if checkpoint is not None:
+        solver.restore_counters(checkpoint)
+    solver.solve()
+    wall_time = time.perf_counter() - start_time
+    assert solver.status is not None
+    return SolveResult(puzzle, puzzle.is_complete(), solver.status, wall_time, solver.rounds, solver.line_evaluations, solver.probes, solver.squares_deduced)
+
+
+# Squares in the busiest lines come first: a guess there has the most to bump into, so it's likeliest to hit a contradiction quickly
+def get_probe_candidates(puzzle: Puzzle) -> list[tuple[int, int]]:
+    known_in_rows = [(filled_mask | blank_mask).bit_count() for filled_mask, blank_mask in map(puzzle.get_row_masks, range(puzzle.num_rows))]
+    known_in_columns = [(filled_mask | blank_mask).bit_count() for filled_mask, blank_mask in map(puzzle.get_column_masks, range(puzzle.num_columns))]
+
+    candidates = [(row_index, column_index) for row_index in range(puzzle.num_rows) for column_index in range(puzzle.num_columns)
+                  if puzzle.get_square(row_index, column_index) == Square.UNKNOWN]
+    candidates.sort(key=lambda square: known_in_rows[square[0]] + known_in_columns[square[1]], reverse=True)
+    return candidates
+
+
+def get_changed_indices(line_changes: LineChanges, line_squares: Sequence[Square]) -> list[int]:
+    return [square_index for square_index, new_value in sorted(line_changes.items())
+            if new_value != Square.UNKNOWN and line_squares[square_index] != new_value]
+
+
+# Rows never share squares with other rows, so every row in a round can be worked on at the same time, and the same goes for columns
+# This solver sends each round's rows, and then its columns, out to a pool of worker processes
+# Lines travel as EncodedLines and come back as a pair of bitmasks, which is far cheaper to pickle than Lines and LineChanges
+# The algorithms are pickled by name, so they need to be plain module-level functions (not LineResultCache wrappers)
+# The algorithms run in the workers, so a profiler only gets to see what probing costs here, and adaptive ordering only applies to probes
+class ParallelPuzzleSolver(PuzzleSolver):
+    max_workers: int
+
+
+    def __init__(self, puzzle: Puzzle, line_algorithm_list: list[LineAlgorithm], on_change: Callable[[Puzzle], None] | None = None,
+                 max_probes: int = 0, max_probe_line_evaluations: int = 1000, profiler: 'SolverProfiler | None' = None, max_workers: int | None = None,
+                 checkpoint_path: str | None = None, checkpoint_interval: float = 60.0, deadline: float | None = None, max_rounds: int | None = None,
+                 max_line_evaluations: int | None = None, cancellation_token: CancellationToken | None = None,
+                 on_progress: 'Callable[[PuzzleSolver], None] | None' = None, progress_interval: float = 1.0) -> None:
+        super().__init__(puzzle, line_algorithm_list, on_change, max_probes, max_probe_line_evaluations, profiler,
+                         checkpoint_path=checkpoint_path, checkpoint_interval=checkpoint_interval, deadline=deadline, max_rounds=max_rounds,
+                         max_line_evaluations=max_line_evaluations, cancellation_token=cancellation_token,
+                         on_progress=on_progress, progress_interval=progress_interval)
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+
+    def solve(self) -> None:
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            self._executor = executor
+            super().solve()
+
+
+    # Probes run on plain PuzzleSolvers, so max_line_evaluations is never passed here. The limits are checked between batches.
+    def _run_line_algorithms(self, max_line_evaluations: int | None = None) -> bool:
+        while len(self._queue) > 0:
+            if self._check_round_limit():
+                return False
+            self.rounds += 1
+            round_line_ids = self._queue.take_round()
+            # All the rows go first, so the columns get to see what the rows found
+            for orientation in ('row', 'column'):
+                batch_line_ids = [line_id for line_id in round_line_ids if line_id[0] == orientation]
+                if self._check_limits():
+                    # Stopping before the rows leaves the whole round unfinished
+                    for unfinished_line_id in round_line_ids if orientation == 'row' else batch_line_ids:
+                        self._queue.mark_dirty(unfinished_line_id)
+                    return False
+                self._evaluate_batch(self._executor, batch_line_ids)
+                self._check_checkpoint()
+                self._check_progress()
+
+        return True
+
+
+    def _evaluate_batch(self, executor: Executor, line_ids: list[LineId]) -> None:
+        batch_line_ids: list[LineId] = []
+        encoded_lines: list[EncodedLine] = []
+
+        for line_id in line_ids:
+            self._queue.discard(line_id)
+            line = self._get_line(line_id)
+            if Square.UNKNOWN not in line.squares:
+                continue
+            batch_line_ids.append(line_id)
+            encoded_lines.append(encode_line(line))
+
+        if len(encoded_lines) == 0:
+            return
+
+        self.line_evaluations += len(encoded_lines)
+
+        # One chunk per worker keeps the number of round trips down
+        chunk_size = math.ceil(len(encoded_lines) / self.max_workers)
+        chunks = [encoded_lines[chunk_start:chunk_start + chunk_size] for chunk_start in range(0, len(encoded_lines), chunk_size)]
+        chunk_results = executor.map(evaluate_encoded_lines, chunks, repeat(self.line_algorithm_list))
+
+        results = [result for chunk_result in chunk_results for result in chunk_result]
+        for line_id, encoded_line, (filled_mask, blank_mask, squares_deduced) in zip(batch_line_ids, encoded_lines, results):
+            for line_algorithm, algorithm_squares_deduced in zip(self.line_algorithm_list, squares_deduced):
+                self.squares_deduced[line_algorithm.__name__] += algorithm_squares_deduced
+
+            # Only the bits the worker added are changes, so we can go straight to them without comparing whole lines
+            line_changes = LineChanges.from_masks(filled_mask & ~encoded_line[1], blank_mask & ~encoded_line[2], encoded_line[3])
+            changed_indices = list(line_changes)
+            if len(changed_indices) > 0:
+                # Puzzle._set_square raises if a worker's deductions conflict with what we already know
+                self._apply_line_changes(line_id, line_changes, changed_indices)
+                self._queue.mark_dirty(line_id)
+
+
+# Runs in a worker process. Does the same as PuzzleSolver._evaluate_line, but for a chunk of lines that aren't attached to a Puzzle.
+# Returns the filled and blank masks of each line after all the algorithms have had a go, and how many squares each algorithm found.
+def evaluate_encoded_lines(encoded_lines: list[EncodedLine], line_algorithm_list: list[LineAlgorithm]) -> list[tuple[int, int, list[int]]]:
+    results: list[tuple[int, int, list[int]]] = []
+
+    for encoded_line in encoded_lines:
+        line = decode_line(encoded_line)
+        squares = line.squares
+        squares_deduced = [0] * len(line_algorithm_list)
+
+        for algorithm_index, line_algorithm in enumerate(line_algorithm_list):
+            line_changes = line_algorithm(line)
+            changed_indices = get_changed_indices(line_changes, squares)
+            if len(changed_indices) == 0:
+                continue
+            squares_deduced[algorithm_index] = len(changed_indices)
+
+            squares = list(squares)
+            for square_index in changed_indices:
+                if squares[square_index] != Square.UNKNOWN:
+                    raise PuzzleContradiction(f'{line_algorithm.__name__} tried to overwrite a square with a different value. Square {square_index}')
+                squares[square_index] = line_changes[square_index]
+            line = Line(line.clued_blocks, squares, line.index, line.orientation, False)
+
+        results.append((*encode_squares(squares), squares_deduced))
+
+    return results
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Sequence
 
 class Square(Enum):
     UNKNOWN = ' ', 'unknown'
@@ -9,4 +10,49 @@ class Square(Enum):
         return self.value[0]
     
     def get_fiendly_string(self):
-        return self.value[1]
\ No newline at end of file
+        return self.value[1]
+
+
+# Lines of squares can be packed into a pair of bitmasks: bit i of the first is set if square i is filled,
+# and bit i of the second is set if square i is a known-blank. Unknown squares have neither bit set.
+# This costs 2 bits per square instead of a pointer, and whole lines can be compared or hashed as a pair of ints.
+
+def encode_squares(squares: Sequence[Square]) -> tuple[int, int]:
+    filled_mask = 0
+    blank_mask = 0
+    for square_index, square in enumerate(squares):
+        if square == Square.FILLED:
+            filled_mask |= 1 << square_index
+        elif square == Square.KNOWN_BLANK:
+            blank_mask |= 1 << square_index
+    return (filled_mask, blank_mask)
+
+
+def decode_squares(filled_mask: int, blank_mask: int, length: int) -> list[Square]:
+    squares = [Square.UNKNOWN] * length
+
+    # Only visit set bits, so mostly-unknown lines are cheap to unpack
+    while filled_mask:
+        lowest_bit = filled_mask & -filled_mask
+        squares[lowest_bit.bit_length() - 1] = Square.FILLED
+        filled_mask ^= lowest_bit
+
+    while blank_mask:
+        lowest_bit = blank_mask & -blank_mask
+        squares[lowest_bit.bit_length() - 1] = Square.KNOWN_BLANK
+        blank_mask ^= lowest_bit
+
+    return squares
+
+
+# Turns one mask per row into one mask per column (or the other way round)
+def transpose_masks(masks: list[int], length: int) -> list[int]:
+    transposed_masks = [0] * length
+    # Only visit set bits, so sparse masks are cheap
+    for mask_index, mask in enumerate(masks):
+        mask_bit = 1 << mask_index
+        while mask:
+            lowest_bit = mask & -mask
+            transposed_masks[lowest_bit.bit_length() - 1] |= mask_bit
+            mask ^= lowest_bit
+    return transposed_masks
\ No newline at end of file
@@ -1,9 +1,27 @@
+import importlib.util
+import io
+import json
+import math
+import os
+import sys
+import tempfile
 import unittest
-from block_utils import get_naive_limits
-from data_classes import CluedBlock, Line
+from batch import find_puzzle_files, run_batch
+from benchmark import find_regressions
+from checkpoint import load_checkpoint
+from block_utils import LineIndex, get_all_naive_limits, get_line_analysis, get_naive_limits, get_possible_block_mappings, get_visible_blocks
+from data_classes import CluedBlock, Line, LineChanges, PuzzleContradiction
+from example_hanjies import house
+from instrumentation import AlgorithmStats, SolverProfiler, get_percentile, max_latency_samples
+from generator import generate_random_bitmap, generate_random_puzzle, get_mask_clues, puzzle_from_bitmap, transpose_bitmap
+from line_cache import LineResultCache
 from puzzle import Puzzle
-from utils import index_of, index_of_any
-from square import Square
+from puzzle_files import iter_puzzles, read_non_clues, write_binary_puzzles
+from solver import AdaptiveAlgorithmOrder, CancellationToken, DirtyLineQueue, ParallelPuzzleSolver, PuzzleSolver, SolveStatus, solve_puzzle
+from utils import ReversedView, index_of, index_of_any
+from visualise_terminal import TerminalPuzzleRenderer
+from line_algorithms import LineAlgorithm, all_blocks_match, check_all_placements, check_edge_hints, check_overlaps, check_possible_visible_clued_mappings, find_known_blank_regions
+from square import Square, decode_squares, encode_squares
 
 
 class UtilsTest(unittest.TestCase):
@@ -29,6 +47,51 @@ class UtilsTest(unittest.TestCase):
         self.assertEqual(index_of_any(int_list, [5]), -1)
 
 
+    def test_reversed_view(self) -> None:
+        items = [0, 1, 2, 3, 4]
+        reversed_items = ReversedView(items)
+        self.assertEqual(len(reversed_items), 5)
+        self.assertEqual(reversed_items, [4, 3, 2, 1, 0])
+        self.assertEqual((reversed_items[0], reversed_items[4], reversed_items[-1], reversed_items[-5]), (4, 0, 0, 4))
+        self.assertEqual(reversed_items[1:3], [3, 2])
+        self.assertEqual(reversed_items[3:], [1, 0])
+        self.assertEqual(reversed_items[::2], [4, 2, 0])
+        self.assertEqual(reversed_items[3:1], [])
+        self.assertEqual(list(reversed(reversed_items)), items)
+        self.assertEqual(index_of(reversed_items, 1), 3)
+        with self.assertRaises(IndexError):
+            reversed_items[5]
+
+        # It's a view, so it sees changes to the list
+        items[0] = 10
+        self.assertEqual(reversed_items[4], 10)
+
+
+class LineChangesTest(unittest.TestCase):
+    def test_line_changes(self) -> None:
+        U, F, B = Square.UNKNOWN, Square.FILLED, Square.KNOWN_BLANK
+        line_changes = LineChanges(5)
+        line_changes[1:3] = [F, F]
+        line_changes[-1] = B
+        self.assertEqual(dict(line_changes), {1: F, 2: F, 4: B})
+        self.assertEqual(line_changes[0], U)
+        self.assertEqual((line_changes[-1], line_changes[-5]), (B, U))
+        self.assertEqual(line_changes[1:4], [F, F, U])
+        self.assertEqual(line_changes[::-2], [B, F, U])
+        self.assertEqual(line_changes.to_list(), [U, F, F, U, B])
+        self.assertEqual(LineChanges.from_masks(0b00110, 0b10000, 5), line_changes)
+        with self.assertRaises(IndexError):
+            line_changes[5] = F
+        with self.assertRaises(IndexError):
+            line_changes[-6]
+        with self.assertRaises(IndexError):
+            line_changes[99]
+
+        line_changes_copy = line_changes.copy()
+        line_changes_copy[0] = B
+        self.assertEqual((len(line_changes), line_changes_copy.length), (3, 5))
+
+
 class SquareTest(unittest.TestCase):
     def test_getters(self) -> None:
         self.assertEqual(Square.UNKNOWN.get_grid_char(), ' ')
@@ -38,6 +101,12 @@ class SquareTest(unittest.TestCase):
         self.assertEqual(Square.KNOWN_BLANK.get_grid_char(), '⋅')
         self.assertEqual(Square.KNOWN_BLANK.get_fiendly_string(), 'blank')
 
+    def test_encoding(self) -> None:
+        squares = [Square.UNKNOWN, Square.FILLED, Square.FILLED, Square.KNOWN_BLANK, Square.UNKNOWN, Square.FILLED]
+        self.assertEqual(encode_squares(squares), (0b100110, 0b001000))
+        self.assertEqual(decode_squares(0b100110, 0b001000, 6), squares)
+        self.assertEqual(decode_squares(0, 0, 3), [Square.UNKNOWN] * 3)
+
 
 class PuzzleTest(unittest.TestCase):
     def test_init(self) -> None:
@@ -59,20 +128,510 @@ class PuzzleTest(unittest.TestCase):
             for clue_index, clued_block in enumerate(column.clued_blocks):
                 self.assertEqual(column_clues[column_index][clue_index], clued_block.length)
 
+    def test_set_squares(self) -> None:
+        puzzle = Puzzle(3, 4, [[1], [1], [1]], [[1], [1], [1], [1]])
+        puzzle.apply_line_changes({0: Square.FILLED, 2: Square.KNOWN_BLANK}, row_index=1)
+        puzzle.apply_line_changes({0: Square.KNOWN_BLANK, 1: Square.FILLED}, column_index=0)
+
+        self.assertEqual(puzzle.get_row(1).squares, [Square.FILLED, Square.UNKNOWN, Square.KNOWN_BLANK, Square.UNKNOWN])
+        self.assertEqual(puzzle.get_column(0).squares, [Square.KNOWN_BLANK, Square.FILLED, Square.UNKNOWN])
+        self.assertEqual(puzzle.get_column(2).squares, [Square.UNKNOWN, Square.KNOWN_BLANK, Square.UNKNOWN])
+        self.assertEqual(puzzle.get_square(0, 0), Square.KNOWN_BLANK)
+
+        with self.assertRaises(Exception):
+            puzzle.apply_line_changes({1: Square.FILLED}, column_index=2)
+
+    def test_line_views(self) -> None:
+        puzzle = Puzzle(3, 4, [[1], [1], [1]], [[1], [1], [1], [1]])
+        row = puzzle.get_row(1)
+        column = puzzle.get_column(2)
+        self.assertIs(puzzle.get_row(1), row)
+        self.assertIn(Square.UNKNOWN, row.squares)
+        self.assertNotIn(Square.FILLED, row.squares)
+        row_analysis = get_line_analysis(row)
+
+        # Changes show up in views we already have, and writing to a view writes to the puzzle
+        puzzle.apply_line_changes({2: Square.KNOWN_BLANK}, row_index=1)
+        row.squares[0] = Square.FILLED
+        self.assertEqual(row.squares, [Square.FILLED, Square.UNKNOWN, Square.KNOWN_BLANK, Square.UNKNOWN])
+        self.assertEqual(column.squares, [Square.UNKNOWN, Square.KNOWN_BLANK, Square.UNKNOWN])
+        self.assertEqual(puzzle.get_column(0).squares[-2], Square.FILLED)
+        self.assertEqual(row.squares[1:3], [Square.UNKNOWN, Square.KNOWN_BLANK])
+        self.assertEqual(list(reversed(row.squares)), [Square.UNKNOWN, Square.KNOWN_BLANK, Square.UNKNOWN, Square.FILLED])
+        # It's a Sequence, so it can go anywhere a list of squares is only read
+        self.assertEqual((row.squares.index(Square.KNOWN_BLANK), row.squares.count(Square.UNKNOWN)), (2, 2))
+        self.assertEqual(encode_squares(row.squares), puzzle.get_row_masks(1))
+        with self.assertRaises(PuzzleContradiction):
+            column.squares[1] = Square.FILLED
+
+        # What we'd worked out about the row no longer holds, so we get a new analysis
+        self.assertIsNot(get_line_analysis(row), row_analysis)
+        self.assertEqual(get_visible_blocks(row)[0].start, 0)
+
+        # A copy's lines are views onto the copy
+        puzzle_copy = puzzle.copy()
+        puzzle_copy.get_row(0).squares[3] = Square.FILLED
+        self.assertEqual(puzzle_copy.get_column(3).squares, [Square.FILLED, Square.UNKNOWN, Square.UNKNOWN])
+        self.assertEqual(puzzle.get_column(3).squares, [Square.UNKNOWN] * 3)
+
 
 class BlockUtilsTest(unittest.TestCase):
     def test_get_limits(self) -> None:
-        clued_block_1 = CluedBlock(3)
-        clued_block_2 = CluedBlock(5)
-        line_with_2_wiggle_room = Line([clued_block_1, clued_block_2], [Square.UNKNOWN] * 11, 1, 'row')
+        clued_block_1 = CluedBlock(3, 0)
+        clued_block_2 = CluedBlock(5, 1)
+        line_with_2_wiggle_room = Line([clued_block_1, clued_block_2], [Square.UNKNOWN] * 11, 1, 'row', False)
         self.assertEqual(get_naive_limits(clued_block_1, line_with_2_wiggle_room), (0, 4))
         self.assertEqual(get_naive_limits(clued_block_2, line_with_2_wiggle_room), (4, 10))
 
-        clued_block_3 = CluedBlock(3)
-        clued_block_4 = CluedBlock(3)
-        line_with_1_wiggle_room = Line([clued_block_3, clued_block_4], [Square.UNKNOWN] * 8, 1, 'row')
+        clued_block_3 = CluedBlock(3, 0)
+        clued_block_4 = CluedBlock(3, 1)
+        line_with_1_wiggle_room = Line([clued_block_3, clued_block_4], [Square.UNKNOWN] * 8, 1, 'row', False)
         self.assertEqual(get_naive_limits(clued_block_3, line_with_1_wiggle_room), (0, 3))
         self.assertEqual(get_naive_limits(clued_block_4, line_with_1_wiggle_room), (4, 7))
+        self.assertEqual(get_all_naive_limits(line_with_1_wiggle_room), [(0, 3), (4, 7)])
+
+        U, F, B = Square.UNKNOWN, Square.FILLED, Square.KNOWN_BLANK
+        line = Line([CluedBlock(1, 0), CluedBlock(2, 1), CluedBlock(1, 2)], [U, U, B, U, F, U, U, B, U], 0, 'row', False)
+        self.assertEqual(get_all_naive_limits(line), [(0, 1), (3, 5), (6, 8)])
+        with self.assertRaises(Exception):
+            get_naive_limits(CluedBlock(1, 0), line)
+        with self.assertRaises(PuzzleContradiction):
+            get_all_naive_limits(Line([CluedBlock(2, 0), CluedBlock(2, 1)], [U, U, B, U, B], 0, 'row', False))
+
+    def test_line_analysis(self) -> None:
+        squares = [Square.UNKNOWN, Square.FILLED, Square.FILLED, Square.KNOWN_BLANK, Square.UNKNOWN, Square.FILLED]
+        line = Line([CluedBlock(2, 0), CluedBlock(1, 1)], squares, 0, 'row', False)
+        analysis = get_line_analysis(line)
+
+        self.assertIs(get_line_analysis(line), analysis)
+        self.assertIs(get_visible_blocks(line), analysis.get_visible_blocks())
+        self.assertEqual([(block.start, block.end) for block in analysis.get_visible_blocks()], [(1, 2), (5, 5)])
+
+        reversed_analysis = analysis.get_reversed()
+        self.assertEqual(reversed_analysis.line.squares, list(reversed(squares)))
+        self.assertEqual(reversed_analysis.line.clued_blocks, list(reversed(line.clued_blocks)))
+        self.assertIs(reversed_analysis.get_reversed(), analysis)
+        self.assertEqual([(block.start, block.end, block.index) for block in reversed_analysis.get_visible_blocks()], [(0, 0, 0), (3, 4, 1)])
+
+    def test_block_mappings(self) -> None:
+        U, F = Square.UNKNOWN, Square.FILLED
+        # The 3 can stretch over the first two visible-blocks, which leaves the last one to the 1
+        line = Line([CluedBlock(3, 0), CluedBlock(1, 1)], [F, U, F, U, U, F], 0, 'row', False)
+        mappings = get_possible_block_mappings(line)
+        self.assertEqual([[clued_block.index for clued_block in mappings[visible_block]] for visible_block in get_visible_blocks(line)], [[0], [0], [1]])
+
+        line = Line([CluedBlock(1, 0), CluedBlock(1, 1), CluedBlock(1, 2)], [U, F, U, U, F, U, U], 0, 'row', False)
+        mappings = get_possible_block_mappings(line)
+        self.assertEqual([[clued_block.index for clued_block in mappings[visible_block]] for visible_block in get_visible_blocks(line)], [[0], [1]])
+
+        with self.assertRaises(PuzzleContradiction):
+            get_possible_block_mappings(Line([CluedBlock(1, 0)], [F, U, F], 0, 'row', False))
+
+    def test_line_index(self) -> None:
+        U, F, B = Square.UNKNOWN, Square.FILLED, Square.KNOWN_BLANK
+        line_index = LineIndex([U, F, F, B, U, F])
+
+        self.assertEqual(line_index.runs, [(U, 0, 1), (F, 1, 3), (B, 3, 4), (U, 4, 5), (F, 5, 6)])
+        self.assertEqual(line_index.run_ends, [1, 3, 3, 4, 5, 6])
+        self.assertEqual(line_index.next_filled, [1, 1, 2, 5, 5, 5, 6])
+        self.assertEqual(line_index.next_blank, [3, 3, 3, 3, 6, 6, 6])
+        self.assertEqual(line_index.last_filled, [-1, -1, 1, 2, 2, 2, 5])
+        self.assertEqual(line_index.last_blank, [-1, -1, -1, -1, 3, 3, 3])
+        self.assertEqual(line_index.filled_before, [0, 0, 1, 2, 2, 2, 3])
+        self.assertEqual(line_index.blanks_before, [0, 0, 0, 0, 1, 1, 1])
+
+        self.assertTrue(line_index.is_filled(2))
+        self.assertFalse(line_index.is_filled(3))
+        self.assertFalse(line_index.is_filled(-1))
+        self.assertFalse(line_index.is_filled(6))
+        self.assertTrue(line_index.has_blank(2, 4))
+        self.assertFalse(line_index.has_blank(4, 10))
+        self.assertEqual(LineIndex([]).runs, [])
+
+
+class LineAlgorithmsTest(unittest.TestCase):
+    def test_check_all_placements(self) -> None:
+        U, F, B = Square.UNKNOWN, Square.FILLED, Square.KNOWN_BLANK
+
+        # A dot in the way of the 3 leaves just enough room for both blocks
+        line = Line([CluedBlock(3, 0), CluedBlock(1, 1)], [U, B, U, U, U, U, U], 0, 'row', False)
+        self.assertEqual(check_all_placements(line).to_list(), [B, U, F, F, F, B, F])
+
+        # The filled square must be part of the first 2, which pins down the middle of the second
+        line = Line([CluedBlock(2, 0), CluedBlock(2, 1)], [U, U, F, U, U, U, U], 0, 'row', False)
+        self.assertEqual(check_all_placements(line).to_list(), [B, U, U, U, U, F, U])
+        line = Line([CluedBlock(2, 0), CluedBlock(2, 1)], [U, U, F, B, U, U, U], 0, 'row', False)
+        self.assertEqual(check_all_placements(line).to_list(), [B, F, U, U, U, F, U])
+
+        line = Line([], [U, U, U], 0, 'row', False)
+        self.assertEqual(check_all_placements(line).to_list(), [B, B, B])
+
+        with self.assertRaises(Exception):
+            check_all_placements(Line([CluedBlock(3, 0)], [U, B, U, U], 0, 'row', False))
+
+    def test_all_blocks_match(self) -> None:
+        U, F, B = Square.UNKNOWN, Square.FILLED, Square.KNOWN_BLANK
+        self.assertTrue(all_blocks_match(Line([CluedBlock(2, 0), CluedBlock(1, 1)], [F, F, U, U, F], 0, 'row', False)))
+        self.assertFalse(all_blocks_match(Line([CluedBlock(2, 0), CluedBlock(1, 1)], [F, U, U, U, F], 0, 'row', False)))
+        self.assertFalse(all_blocks_match(Line([CluedBlock(2, 0), CluedBlock(1, 1)], [F, F, B, U, U], 0, 'row', False)))
+
+
+class LineCacheTest(unittest.TestCase):
+    def test_cache(self) -> None:
+        U, F = Square.UNKNOWN, Square.FILLED
+        calls: list[Line] = []
+        def fill_everything(line: Line) -> LineChanges:
+            calls.append(line)
+            line_changes = LineChanges(len(line.squares))
+            line_changes[:] = [F] * len(line.squares)
+            return line_changes
+
+        cache = LineResultCache(max_size=2)
+        cached_fill_everything = cache.wrap(fill_everything)
+
+        # Same clue lengths and squares, so the second line is a hit even though it's a different row
+        self.assertEqual(cached_fill_everything(Line([CluedBlock(2, 0)], [U, U], 0, 'row', False)).to_list(), [F, F])
+        self.assertEqual(cached_fill_everything(Line([CluedBlock(2, 0)], [U, U], 3, 'column', False)).to_list(), [F, F])
+        self.assertEqual((cache.hits, cache.misses, len(calls)), (1, 1, 1))
+
+        cached_fill_everything(Line([CluedBlock(1, 0)], [U, U], 0, 'row', False))
+        cached_fill_everything(Line([CluedBlock(1, 0)], [U, F], 0, 'row', False))
+        self.assertEqual(len(cache), 2)
+
+        # The first line was least recently used, so it should have been evicted
+        cached_fill_everything(Line([CluedBlock(2, 0)], [U, U], 0, 'row', False))
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+
+class SolverTest(unittest.TestCase):
+    def test_dirty_line_queue(self) -> None:
+        queue = DirtyLineQueue()
+        queue.mark_dirty(('row', 0))
+        queue.mark_dirty(('column', 2))
+        queue.mark_dirty(('row', 0))
+        self.assertEqual(len(queue), 2)
+
+        queue.discard(('column', 2))
+        self.assertEqual(queue.take_round(), [('row', 0)])
+        self.assertEqual(len(queue), 0)
+
+    def test_solve(self) -> None:
+        puzzle = house.copy()
+        solver = PuzzleSolver(puzzle, [check_overlaps, check_edge_hints, check_possible_visible_clued_mappings, find_known_blank_regions])
+        solver.solve()
+
+        grid = [''.join(square.get_grid_char() for square in row.squares) for row in puzzle.get_rows()]
+        self.assertEqual(grid, ['⋅⋅#⋅⋅', '⋅###⋅', '#####', '#⋅⋅⋅#', '#⋅⋅⋅#'])
+        self.assertEqual(sum(solver.squares_deduced.values()), 25)
+
+    def test_solve_puzzle(self) -> None:
+        puzzle = house.copy()
+        result = solve_puzzle(puzzle)
+        self.assertIs(result.puzzle, puzzle)
+        self.assertTrue(result.complete)
+        self.assertEqual(sum(result.squares_deduced.values()), 25)
+        self.assertNotIn('visualise_pygame', sys.modules)
+
+    def test_limits(self) -> None:
+        self.assertEqual(solve_puzzle(house.copy()).status, 'solved')
+
+        result = solve_puzzle(house.copy(), max_rounds=1)
+        self.assertEqual((result.status, result.rounds), ('max_rounds', 1))
+        self.assertFalse(result.complete)
+
+        result = solve_puzzle(house.copy(), max_line_evaluations=4)
+        self.assertEqual((result.status, result.line_evaluations), ('max_line_evaluations', 4))
+        self.assertEqual(solve_puzzle(house.copy(), time_limit=0).status, 'deadline')
+
+        # Whatever was deduced before stopping stays in the puzzle, so solving it again picks up from there
+        cancellation_token = CancellationToken()
+        cancellation_token.cancel()
+        result = solve_puzzle(house.copy(), cancellation_token=cancellation_token)
+        self.assertEqual((result.status, result.line_evaluations), ('cancelled', 0))
+        self.assertEqual(solve_puzzle(result.puzzle).status, 'solved')
+
+        progress: list[tuple[int, SolveStatus | None]] = []
+        solve_puzzle(house.copy(), on_progress=lambda solver: progress.append((solver.line_evaluations, solver.status)), progress_interval=0)
+        self.assertGreater(len(progress), 2)
+        self.assertEqual(progress[-1][1], 'solved') # The last report is once the solve has finished
+        self.assertEqual(progress, sorted(progress, key=lambda report: report[0]))
+
+    def test_stuck_status(self) -> None:
+        # The line algorithms get stuck on this one, and it has two solutions, so probing can't finish it either
+        self.assertEqual(solve_puzzle(Puzzle(2, 2, [[1], [1]], [[1], [1]]), max_probes=3).status, 'stuck')
+
+    def test_adaptive(self) -> None:
+        algorithm_order = AdaptiveAlgorithmOrder([check_overlaps, check_edge_hints, check_all_placements])
+        algorithm_order.record(check_overlaps, 1000, 1)
+        algorithm_order.record(check_all_placements, 1000, 5)
+        algorithm_order.reorder()
+        # check_edge_hints hasn't been tried yet, so it gets its chance first
+        self.assertEqual(algorithm_order.line_algorithm_list, [check_edge_hints, check_all_placements, check_overlaps])
+
+        line_algorithm_list: list[LineAlgorithm] = [check_overlaps, check_edge_hints, check_possible_visible_clued_mappings, find_known_blank_regions, check_all_placements]
+        grids: list[list[list[Square]]] = []
+        for adaptive in (False, True):
+            puzzle = house.copy()
+            solver = PuzzleSolver(puzzle, line_algorithm_list, adaptive=adaptive)
+            solver.solve()
+            self.assertTrue(puzzle.is_complete())
+            grids.append([puzzle.get_row_squares(row_index) for row_index in range(puzzle.num_rows)])
+        self.assertEqual(grids[0], grids[1])
+
+    def test_probing(self) -> None:
+        line_algorithm_list: list[LineAlgorithm] = [check_overlaps, check_edge_hints, check_possible_visible_clued_mappings, find_known_blank_regions, check_all_placements]
+
+        # The line algorithms get stuck on this one
+        puzzle = Puzzle(5, 5, [[2], [4], [3], [1], [1]], [[2], [2], [2], [3], [1, 1]])
+        PuzzleSolver(puzzle, line_algorithm_list).solve()
+        self.assertFalse(puzzle.is_complete())
+
+        puzzle = Puzzle(5, 5, [[2], [4], [3], [1], [1]], [[2], [2], [2], [3], [1, 1]])
+        solver = PuzzleSolver(puzzle, line_algorithm_list, max_probes=50)
+        solver.solve()
+
+        grid = [''.join(square.get_grid_char() for square in row.squares) for row in puzzle.get_rows()]
+        self.assertEqual(grid, ['##⋅⋅⋅', '####⋅', '⋅⋅###', '⋅⋅⋅#⋅', '⋅⋅⋅⋅#'])
+        self.assertLessEqual(solver.probes, 50)
+
+    def test_probe_limit(self) -> None:
+        # Two solutions, so no probe can ever find a contradiction
+        puzzle = Puzzle(2, 2, [[1], [1]], [[1], [1]])
+        solver = PuzzleSolver(puzzle, [check_all_placements], max_probes=3)
+        solver.solve()
+        self.assertFalse(puzzle.is_complete())
+        self.assertEqual(solver.probes, 3)
+
+    def test_solve_in_parallel(self) -> None:
+        puzzle = house.copy()
+        solver = ParallelPuzzleSolver(puzzle, [check_overlaps, check_all_placements], max_workers=2)
+        solver.solve()
+
+        grid = [''.join(square.get_grid_char() for square in row.squares) for row in puzzle.get_rows()]
+        self.assertEqual(grid, ['⋅⋅#⋅⋅', '⋅###⋅', '#####', '#⋅⋅⋅#', '#⋅⋅⋅#'])
+
+
+
+class GeneratorTest(unittest.TestCase):
+    def test_clues(self) -> None:
+        self.assertEqual(get_mask_clues(0), [])
+        self.assertEqual(get_mask_clues(0b1101110), [3, 2])
+        self.assertEqual(transpose_bitmap([0b011, 0b110], 3), [0b01, 0b11, 0b10])
+
+        puzzle = puzzle_from_bitmap([0b101, 0, 0b111], 3)
+        self.assertEqual([[clued_block.length for clued_block in line_clues] for line_clues in puzzle.row_clues], [[1, 1], [], [3]])
+        self.assertEqual([[clued_block.length for clued_block in line_clues] for line_clues in puzzle.column_clues], [[1, 1], [1], [1, 1]])
+
+    def test_random(self) -> None:
+        self.assertEqual(generate_random_bitmap(30, 30, 0.5, seed=7), generate_random_bitmap(30, 30, 0.5, seed=7))
+        self.assertNotEqual(generate_random_bitmap(30, 30, 0.5, seed=7), generate_random_bitmap(30, 30, 0.5, seed=8))
+        self.assertEqual(generate_random_bitmap(4, 5, 1), [0b11111] * 4)
+        self.assertRaises(Exception, lambda: generate_random_bitmap(1001, 5))
+
+        # Whatever the solver comes up with has to match the clues, even if it isn't the picture we started from
+        puzzle = generate_random_puzzle(15, 15, 0.7, seed=1)
+        PuzzleSolver(puzzle, [check_overlaps, check_edge_hints, check_all_placements], max_probes=100).solve()
+        self.assertTrue(puzzle.is_complete())
+        solution = [puzzle.get_row_masks(row_index)[0] for row_index in range(puzzle.num_rows)]
+        solved_puzzle = puzzle_from_bitmap(solution, puzzle.num_columns)
+        self.assertEqual(solved_puzzle.row_clues, puzzle.row_clues)
+        self.assertEqual(solved_puzzle.column_clues, puzzle.column_clues)
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_profiler(self) -> None:
+        self.assertEqual(get_percentile([], 50), 0)
+        self.assertEqual(get_percentile([5, 1, 4, 2, 3], 50), 3)
+        self.assertEqual(get_percentile([5, 1, 4, 2, 3], 99), 5)
+
+        puzzle = house.copy()
+        profiler = SolverProfiler(per_line=True)
+        solver = PuzzleSolver(puzzle, [check_overlaps, check_all_placements], profiler=profiler)
+        solver.solve()
+
+        overlaps_stats = profiler.algorithm_stats['check_overlaps']
+        self.assertEqual(overlaps_stats.calls, solver.line_evaluations)
+        self.assertEqual(overlaps_stats.squares_deduced, solver.squares_deduced['check_overlaps'])
+        self.assertEqual(sum(stats.squares_deduced for stats in profiler.algorithm_stats.values()), 25)
+        self.assertEqual(sum(stats.calls for (algorithm_name, _), stats in profiler.line_stats.items() if algorithm_name == 'check_overlaps'), overlaps_stats.calls)
+        self.assertEqual(profiler.line_stats[('check_overlaps', ('row', 2))].squares_deduced, 5)
+
+        stacks = profiler.get_collapsed_stacks()
+        self.assertIn('solve;check_overlaps;row 2 ', [stack.rsplit(' ', 1)[0] + ' ' for stack in stacks])
+        self.assertEqual(set(profiler.to_dict()['algorithms']), {'check_overlaps', 'check_all_placements'})
+
+        # However many runs there are, only a sample of their latencies is kept, but the slowest one is still known
+        algorithm_stats = AlgorithmStats()
+        for elapsed_ns in range(1, 10 * max_latency_samples + 1):
+            algorithm_stats.record(elapsed_ns * 1000, 0)
+        self.assertEqual(len(algorithm_stats.latencies_ns), max_latency_samples)
+        stats_dict = algorithm_stats.to_dict()
+        self.assertEqual(stats_dict['max_us'], 10 * max_latency_samples)
+        self.assertAlmostEqual(stats_dict['p50_us'], 5 * max_latency_samples, delta=max_latency_samples)
+
+
+class PuzzleFilesTest(unittest.TestCase):
+    def test_non(self) -> None:
+        non_lines = ['title "House"', 'width 5', 'height 5', '', 'rows', '1', '3', '5', '1,1', '1 1', '', 'columns', '3', '2', '3', '0', '3', 'goal "0010001110"']
+        self.assertEqual(read_non_clues(non_lines), ([[1], [3], [5], [1, 1], [1, 1]], [[3], [2], [3], [], [3]]))
+
+        with self.assertRaises(Exception):
+            read_non_clues(['width 2', 'height 2', 'rows', '1', '1', 'columns', '2'])
+
+        # Blank lines are lines with no clues, even at the start of a section
+        self.assertEqual(read_non_clues(['width 2', 'height 2', 'rows', '', '1', 'columns', '1', '']), ([[], [1]], [[1], []]))
+        with self.assertRaises(Exception):
+            read_non_clues(['width 2', 'height 2', 'rows', '1', '1', '1', 'columns', '1', '1'])
+
+    def test_binary(self) -> None:
+        small_puzzle = house.copy()
+        # A 200 needs a two byte varint, so this one can't take the shortcut
+        big_puzzle = Puzzle(1, 200, [[200]], [[1]] * 200)
+
+        with tempfile.TemporaryDirectory() as directory:
+            for puzzles in ([small_puzzle, small_puzzle], [small_puzzle, big_puzzle]):
+                path = os.path.join(directory, 'puzzles.hjb')
+                write_binary_puzzles(path, puzzles)
+                loaded_puzzles = list(iter_puzzles(path))
+                self.assertEqual([(puzzle.row_clues, puzzle.column_clues) for puzzle in loaded_puzzles], [(puzzle.row_clues, puzzle.column_clues) for puzzle in puzzles])
+
+            with open(path, 'rb') as puzzle_file:
+                data = puzzle_file.read()
+            with open(path, 'wb') as puzzle_file:
+                puzzle_file.write(data[:-3])
+            with self.assertRaises(Exception):
+                list(iter_puzzles(path))
+
+            path = os.path.join(directory, 'puzzles.jsonl')
+            with open(path, 'w') as puzzle_file:
+                puzzle_file.write('{"rows": [[1]], "columns": [[1]]}\n\n{"rows": [[2]], "columns": [[1], [1]]}\n')
+            self.assertEqual([puzzle.num_columns for puzzle in iter_puzzles(path)], [1, 2])
+
+
+class CheckpointTest(unittest.TestCase):
+    def test_resume(self) -> None:
+        line_algorithm_list: list[LineAlgorithm] = [check_overlaps, check_edge_hints, check_possible_visible_clued_mappings, find_known_blank_regions]
+        solved_puzzle = house.copy()
+        solve_puzzle(solved_puzzle, line_algorithm_list)
+
+        class Crash(Exception):
+            pass
+        change_count = 0
+        def crash_after_a_few_changes(_: Puzzle) -> None:
+            nonlocal change_count
+            change_count += 1
+            if change_count == 5:
+                raise Crash()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'house.checkpoint')
+            puzzle = house.copy()
+            with self.assertRaises(Crash):
+                solve_puzzle(puzzle, line_algorithm_list, on_change=crash_after_a_few_changes, checkpoint_path=path, checkpoint_interval=0)
+            self.assertEqual(os.listdir(directory), ['house.checkpoint'])
+
+            checkpoint = load_checkpoint(path)
+            self.assertEqual(checkpoint.puzzle.row_clues, puzzle.row_clues)
+            self.assertEqual(checkpoint.puzzle.column_clues, puzzle.column_clues)
+            self.assertFalse(checkpoint.puzzle.is_complete())
+            self.assertGreater(checkpoint.line_evaluations, 0)
+            for row_index in range(5):
+                # The checkpoint can be a little behind the crash, but never ahead of it
+                checkpoint_filled, checkpoint_blank = checkpoint.puzzle.get_row_masks(row_index)
+                filled_mask, blank_mask = puzzle.get_row_masks(row_index)
+                self.assertEqual((checkpoint_filled & ~filled_mask, checkpoint_blank & ~blank_mask), (0, 0))
+
+            result = solve_puzzle(checkpoint.puzzle, line_algorithm_list, checkpoint_path=path, checkpoint=checkpoint)
+            self.assertTrue(result.complete)
+            self.assertGreater(result.line_evaluations, checkpoint.line_evaluations)
+            self.assertEqual([result.puzzle.get_row_masks(row_index) for row_index in range(5)], [solved_puzzle.get_row_masks(row_index) for row_index in range(5)])
+            self.assertTrue(load_checkpoint(path).puzzle.is_complete())
+
+
+class BatchTest(unittest.TestCase):
+    def test_solve_puzzle_files(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'more'))
+            puzzles = {
+                'house.json': {'rows': [[1], [3], [5], [1, 1], [1, 1]], 'columns': [[3], [2], [3], [2], [3]]},
+                os.path.join('more', 'impossible.json'): {'rows': [[3]], 'columns': [[1]]},
+                'no_columns.json': {'rows': [[1]]},
+            }
+            for file_name, puzzle_dict in puzzles.items():
+                with open(os.path.join(directory, file_name), 'w') as puzzle_file:
+                    json.dump(puzzle_dict, puzzle_file)
+            with open(os.path.join(directory, 'notes.txt'), 'w') as notes_file:
+                notes_file.write('Not a puzzle')
+
+            puzzle_paths = find_puzzle_files([directory])
+            self.assertEqual([os.path.relpath(path, directory) for path in puzzle_paths], ['house.json', 'no_columns.json', os.path.join('more', 'impossible.json')])
+
+            output = io.StringIO()
+            status_counts = run_batch(puzzle_paths, output, max_workers=1)
+            self.assertEqual(status_counts, {'solved': 1, 'error': 1, 'contradiction': 1})
+
+            results = {os.path.basename(result['path']): result for result in map(json.loads, output.getvalue().splitlines())}
+            self.assertEqual(results['house.json']['grid'], ['..#..', '.###.', '#####', '#...#', '#...#'])
+            self.assertEqual(results['impossible.json']['status'], 'contradiction')
+
+
+class TerminalRendererTest(unittest.TestCase):
+    def test_incremental_frames(self) -> None:
+        puzzle = Puzzle(12, 12, [[1]] * 12, [[1]] * 12)
+        output = io.StringIO()
+        renderer = TerminalPuzzleRenderer(puzzle, output, max_fps=math.inf, viewport_size=(4, 6))
+
+        renderer.visualise_puzzle(puzzle)
+        first_frame = output.getvalue()
+        self.assertTrue(first_frame.startswith('\x1b[?25l\x1b[2J\x1b[H'))
+        self.assertEqual(first_frame.count('|'), 4 + 4) # Row headers, plus the guide line down column 4
+
+        # Only the changed squares are written, each run after a cursor move to it (row 1 is on line 5, under 2 lines of column numbers and the underline)
+        output.truncate(0)
+        output.seek(0)
+        puzzle.apply_line_changes({1: Square.FILLED, 2: Square.KNOWN_BLANK, 5: Square.FILLED}, row_index=1)
+        renderer.visualise_puzzle(puzzle)
+        self.assertEqual(output.getvalue(), f'\x1b[5;5H{Square.FILLED.get_grid_char()}{Square.KNOWN_BLANK.get_grid_char()}\x1b[5;9H{Square.FILLED.get_grid_char()}')
+
+        # Nothing changed, nothing written
+        output.truncate(0)
+        output.seek(0)
+        renderer.visualise_puzzle(puzzle)
+        self.assertEqual(output.getvalue(), '')
+
+        # A change outside the viewport moves it there, and redraws everything
+        puzzle.apply_line_changes({10: Square.FILLED}, row_index=9)
+        renderer.visualise_puzzle(puzzle)
+        self.assertEqual((renderer.top_row, renderer.left_column), (7, 6))
+        self.assertIn('\x1b[2J', output.getvalue())
+
+        renderer.scroll_by(-100, 1)
+        self.assertEqual((renderer.top_row, renderer.left_column), (0, 6))
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_find_regressions(self) -> None:
+        baseline = [{'name': 'a', 'complete': True, 'wall_time': 1.0, 'rounds': 5, 'line_evaluations': 50, 'probes': 0}]
+        self.assertEqual(find_regressions([dict(baseline[0], wall_time=1.1)], baseline, 0.25), [])
+
+        results = [{'name': 'a', 'complete': False, 'wall_time': 2.0, 'rounds': 5, 'line_evaluations': 60, 'probes': 0}]
+        self.assertEqual(len(find_regressions(results, baseline, 0.25)), 3)
+
+
+@unittest.skipUnless(importlib.util.find_spec('numpy'), 'numpy is optional')
+class NumpyEngineTest(unittest.TestCase):
+    def test_batch_deductions_match_line_algorithms(self) -> None:
+        from numpy_engine import ClueMatrix, check_edge_hints_batch, check_overlaps_batch, find_known_blank_regions_batch, get_grid, square_codes
+
+        puzzle = house.copy()
+        puzzle.apply_line_changes({0: Square.FILLED, 4: Square.KNOWN_BLANK}, column_index=2)
+        puzzle.apply_line_changes({4: Square.FILLED}, row_index=3)
+        grid = get_grid(puzzle)
+
+        for lines, clues, puzzle_lines in [(grid, ClueMatrix(puzzle.row_clues), puzzle.get_rows()), (grid.T, ClueMatrix(puzzle.column_clues), puzzle.get_columns())]:
+            for line_algorithm, batch_deduction in [(check_overlaps, check_overlaps_batch), (check_edge_hints, check_edge_hints_batch), (find_known_blank_regions, find_known_blank_regions_batch)]:
+                expected = [[square_codes[square] for square in line_algorithm(line).to_list()] for line in puzzle_lines]
+                self.assertEqual(batch_deduction(lines, clues).tolist(), expected)
 
 
 if __name__ == '__main__':
@@ -1,18 +1,84 @@
+from typing import Iterator, Sequence, overload
+
+
 def rev_list[T](list_to_reverse:list[T]) -> list[T]:
     return list(reversed(list_to_reverse))
 
 
-def index_of[T](container: list[T], value: T, start_index: int = 0) -> int:
+def index_of[T](container: Sequence[T], value: T, start_index: int = 0) -> int:
     for index in range(start_index, len(container)):
         if container[index] == value:
             return index
     return -1
 
 
-def index_of_any[T](container: list[T], values: list[T], start_index: int = 0) -> int:
+def index_of_any[T](container: Sequence[T], values: list[T], start_index: int = 0) -> int:
     for index in range(start_index, len(container)):
         for target_value in values:
             if container[index] == target_value:
                 return index
 
     return -1
+
+
+# A list read back to front, without copying it. Index i of the view is index len - 1 - i of the list.
+# The list mustn't change length while the view is in use. Slices come back as plain (reversed) lists.
+class ReversedView[T](Sequence[T]):
+    __slots__ = ('_items', '_last_index')
+
+
+    def __init__(self, items: list[T]) -> None:
+        self._items = items
+        self._last_index = len(items) - 1
+
+
+    def __len__(self) -> int:
+        return self._last_index + 1
+
+
+    @overload
+    def __getitem__(self, key: int) -> T: ...
+    @overload
+    def __getitem__(self, key: slice) -> list[T]: ...
+    def __getitem__(self, key: int | slice) -> T | list[T]:
+        if isinstance(key, slice):
+            # Most slices are a plain window inside the list, which we can go straight to
+            start, stop = key.start, key.stop
+            if key.step is None and type(start) is int and type(stop) is int and 0 <= start < stop <= self._last_index + 1:
+                return self._items[self._last_index - stop + 1:self._last_index - start + 1][::-1]
+
+            start, stop, step = key.indices(self._last_index + 1)
+            if step != 1:
+                return [self._items[self._last_index - index] for index in range(start, stop, step)]
+            if stop <= start:
+                return []
+            # Squares start to stop of the view are squares (last - stop + 1) to (last - start) of the list, the other way round
+            return self._items[self._last_index - stop + 1:self._last_index - start + 1][::-1]
+
+        if key < 0:
+            return self._items[-key - 1]
+        if key > self._last_index:
+            raise IndexError(f'Index {key} is outside a list of length {self._last_index + 1}')
+        return self._items[self._last_index - key]
+
+
+    def __iter__(self) -> Iterator[T]:
+        return reversed(self._items)
+
+
+    def __reversed__(self) -> Iterator[T]:
+        return iter(self._items)
+
+
+    def __contains__(self, value: object) -> bool:
+        return value in self._items
+
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, ReversedView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+
+    def __repr__(self) -> str:
+        return f'ReversedView({list(self)!r})'
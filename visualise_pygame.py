@@ -2,6 +2,7 @@ from dataclasses import dataclass
 import math
 import pygame
 import multiprocessing as mp
+import queue
 import time
 
 from puzzle import Puzzle
@@ -25,38 +26,85 @@ thick_line_width = 3
 clue_text_font_size = 20
 clue_text_width = 15
 clue_text_height = 12
+update_interval = 1 / 30 # Seconds between updates sent to the display, anything that changes in between goes in the next one
+max_queued_updates = 4   # If the display falls this far behind, we stop sending until it catches up
+flush_check_interval = 0.1 # Seconds flush waits for room in the queue before checking the display is still open
+
+# Rather than the whole puzzle, the display gets sent what changed since the last update, as one RowDelta for each row that changed
+type RowDelta = tuple[int, int, int] # (row index, mask of newly filled squares, mask of newly blank squares)
 
 # Shouldn't need this, but I'm getting a weird error using the raw type as a function parameter type
-type PuzzleQueue = mp.Queue[Puzzle]
+type DeltaQueue = mp.Queue[list[RowDelta]]
 type StrQueue = mp.Queue[str]
 
 
+# The solver calls visualise_puzzle after every change, which can be thousands of times a second
+# So that has to be cheap, and must never wait for the display: it only looks at the puzzle once per update_interval,
+# sends just the squares that changed since the last update, and skips the update if the display has fallen behind
+# Call flush when solving is done, to send whatever changed since the last update
+# The window can be closed at any time, after which nothing will ever make room in the queue, so then the changes just get dropped
 class PygamePuzzleVisualiser:
     def __init__(self, puzzle: Puzzle):
-        self.puzzle_update_queue: PuzzleQueue = mp.Queue()
+        self.delta_queue: DeltaQueue = mp.Queue(maxsize=max_queued_updates)
         self.init_result_queue: mp.Queue[str] = mp.Queue()
+        # What the display has been sent so far, which starts as the puzzle it gets below
+        self._sent_row_masks = [puzzle.get_row_masks(row_index) for row_index in range(puzzle.num_rows)]
+        self._last_update_time = 0.0
 
         self.display_process = mp.Process(target = pygame_puzzle_display_loop,
-                   args = [puzzle, self.puzzle_update_queue, self.init_result_queue])
+                   args = [puzzle, self.delta_queue, self.init_result_queue])
         self.display_process.start()
 
-        while self.init_result_queue.empty():
-            print("Waiting for display to init...")
-            time.sleep(0.5)
-
+        # Blocks until the display is ready, rather than checking back every so often
+        print("Waiting for display to init...")
         init_result = self.init_result_queue.get()
         if init_result == "done":
             print("Display process inited successfully, let's crack this puzzle")
 
 
     def visualise_puzzle(self, puzzle: Puzzle):
-        self.puzzle_update_queue.put(puzzle)
+        if time.perf_counter() - self._last_update_time >= update_interval:
+            self._send_changes(puzzle, timeout=None)
+
+
+    def flush(self, puzzle: Puzzle):
+        # Wait for the display to make room, but only while there's still a display to wait for
+        while self.display_process.is_alive():
+            if self._send_changes(puzzle, timeout=flush_check_interval):
+                return
+
+        # Whatever didn't make it into the pipe before the display went away never will, so don't let exiting wait on it either
+        self.delta_queue.cancel_join_thread()
+
+
+    # Returns whether everything that changed has been sent. With a timeout of None, this doesn't wait at all if the queue is full.
+    def _send_changes(self, puzzle: Puzzle, timeout: float | None) -> bool:
+        self._last_update_time = time.perf_counter()
+
+        row_deltas: list[RowDelta] = []
+        for row_index, (sent_filled_mask, sent_blank_mask) in enumerate(self._sent_row_masks):
+            filled_mask, blank_mask = puzzle.get_row_masks(row_index)
+            if filled_mask != sent_filled_mask or blank_mask != sent_blank_mask:
+                row_deltas.append((row_index, filled_mask & ~sent_filled_mask, blank_mask & ~sent_blank_mask))
+
+        if len(row_deltas) == 0:
+            return True
+
+        try:
+            self.delta_queue.put(row_deltas, block=timeout is not None, timeout=timeout)
+        except queue.Full:
+            return False # The display is behind. We haven't marked these as sent, so they'll go out with the next update.
+
+        for row_index, new_filled_mask, new_blank_mask in row_deltas:
+            sent_filled_mask, sent_blank_mask = self._sent_row_masks[row_index]
+            self._sent_row_masks[row_index] = (sent_filled_mask | new_filled_mask, sent_blank_mask | new_blank_mask)
+        return True
 
 
 class CachedPuzzleDisplayProps:
     def __init__(self, puzzle: Puzzle):
-        self.num_columns = len(puzzle.get_columns())
-        self.num_rows = len(puzzle.get_rows())
+        self.num_columns = puzzle.num_columns
+        self.num_rows = puzzle.num_rows
         self.max_column_width = math.floor(grid_max_width / self.num_columns)
         self.max_row_height = math.floor(grid_max_height / self.num_rows)
         self.cell_width = min(self.max_column_width, self.max_row_height)
@@ -64,8 +112,8 @@ class CachedPuzzleDisplayProps:
         self.grid_height = self.num_rows * self.cell_width
         self.dot_offset = (self.cell_width / 2) - 1 + default_line_width
 
-        max_column_clue_count = max([len(column.clued_blocks) for column in puzzle.get_columns()])
-        max_row_clue_count = max([len(row.clued_blocks) for row in puzzle.get_rows()])
+        max_column_clue_count = max([len(column_clues) for column_clues in puzzle.column_clues])
+        max_row_clue_count = max([len(row_clues) for row_clues in puzzle.row_clues])
         self.height_for_column_clues = clue_text_height * max_column_clue_count
         self.width_for_row_clues = clue_text_width * max_row_clue_count
 
@@ -78,7 +126,7 @@ class DisplaySurfaces:
     squares: pygame.Surface
 
 
-def pygame_puzzle_display_loop(puzzle: Puzzle, puzzle_update_queue: PuzzleQueue, init_result_queue: StrQueue):
+def pygame_puzzle_display_loop(puzzle: Puzzle, delta_queue: DeltaQueue, init_result_queue: StrQueue):
     props = CachedPuzzleDisplayProps(puzzle)
 
     print("Setup display...")
@@ -87,11 +135,20 @@ def pygame_puzzle_display_loop(puzzle: Puzzle, puzzle_update_queue: PuzzleQueue,
 
     init_result_queue.put("done")
 
+    clock = pygame.time.Clock()
     while True:
-        if not puzzle_update_queue.empty():
-                print("Queue is not empty, updating display")
-                fill_solved_squares(surfaces.squares, puzzle_update_queue.get(), props)
-                blit_all_and_flip(surfaces, props)
+        # Draw everything that's waiting, then flip once, so a burst of updates only costs one frame
+        has_updates = False
+        while True:
+            try:
+                row_deltas = delta_queue.get_nowait()
+            except queue.Empty:
+                break
+            fill_changed_squares(surfaces.squares, row_deltas, props)
+            has_updates = True
+
+        if has_updates:
+            blit_all_and_flip(surfaces, props)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -99,6 +156,8 @@ def pygame_puzzle_display_loop(puzzle: Puzzle, puzzle_update_queue: PuzzleQueue,
                 pygame.quit()
                 return
 
+        clock.tick(60)
+
 
 def setup_display(puzzle: Puzzle, props: CachedPuzzleDisplayProps) -> DisplaySurfaces:
     print("Pygame init...")
@@ -112,6 +171,8 @@ def setup_display(puzzle: Puzzle, props: CachedPuzzleDisplayProps) -> DisplaySur
     grid_surface = draw_grid(props)
     squares_surface = pygame.Surface((props.grid_width, props.grid_height), flags=pygame.SRCALPHA)
     squares_surface.fill((0, 0, 0, 0))
+    # Whatever was known before we started counts as changed since nothing
+    fill_changed_squares(squares_surface, [(row_index, *puzzle.get_row_masks(row_index)) for row_index in range(puzzle.num_rows)], props)
 
     surfaces = DisplaySurfaces(window, clues_surface, grid_surface, squares_surface)
     blit_all_and_flip(surfaces, props)
@@ -142,16 +203,19 @@ def draw_clues(puzzle: Puzzle, props: CachedPuzzleDisplayProps) -> pygame.Surfac
     return clue_surface
 
 
-def fill_solved_squares(window: pygame.Surface, puzzle: Puzzle, props: CachedPuzzleDisplayProps):
-    for row_index, row in enumerate(puzzle.get_rows()):
+def fill_changed_squares(window: pygame.Surface, row_deltas: list[RowDelta], props: CachedPuzzleDisplayProps):
+    for row_index, filled_mask, blank_mask in row_deltas:
         top = row_index * props.cell_width
-        for column_index, cell_value in enumerate(row.squares):
-            if cell_value == Square.FILLED:
-                left = column_index * props.cell_width
-                pygame.draw.rect(window, fill_colour, pygame.Rect(left, top, props.cell_width, props.cell_width))
-            elif cell_value == Square.KNOWN_BLANK:
-                left = column_index * props.cell_width
-                pygame.draw.rect(window, fill_colour, pygame.Rect(left + props.dot_offset, top + props.dot_offset, 2, 2))
+        for cell_value, mask in ((Square.FILLED, filled_mask), (Square.KNOWN_BLANK, blank_mask)):
+            # Only visit the set bits, since a delta usually only touches a few squares in the row
+            while mask:
+                lowest_bit = mask & -mask
+                left = (lowest_bit.bit_length() - 1) * props.cell_width
+                mask ^= lowest_bit
+                if cell_value == Square.FILLED:
+                    pygame.draw.rect(window, fill_colour, pygame.Rect(left, top, props.cell_width, props.cell_width))
+                else:
+                    pygame.draw.rect(window, fill_colour, pygame.Rect(left + props.dot_offset, top + props.dot_offset, 2, 2))
 
 
 def draw_grid(props: CachedPuzzleDisplayProps) -> pygame.Surface:
@@ -176,7 +240,6 @@ def draw_grid(props: CachedPuzzleDisplayProps) -> pygame.Surface:
 
 def blit_all_and_flip(surfaces: DisplaySurfaces, props: CachedPuzzleDisplayProps):
     # On each update, we blit all the surfaces again, in the order we want to layer them
-    print("Blit all and flip")
 
     surfaces.window.blit(surfaces.clues, (0, 0))
 
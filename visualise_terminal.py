@@ -1,28 +1,29 @@
+from typing import TextIO
 import math
+import shutil
+import sys
+import time
 from puzzle import Puzzle
 from square import Square
 
 
 def visualise_puzzle(puzzle:Puzzle) -> str:
     column_headers = get_column_headers(puzzle)
-    return column_headers + '\n'.join([get_row_header(row_index) + visualise_row(row, row_index) for row_index, row in enumerate(puzzle._row_squares)])
+    return column_headers + '\n'.join([get_row_header(row_index) + visualise_row(puzzle.get_row_squares(row_index), row_index) for row_index in range(puzzle.num_rows)])
 
 
 def visualise_row(row_squares:list[Square], row_index: int) -> str:
-    row_str = ''
-
-    for square_index, square in enumerate(row_squares):
-        if square == Square.UNKNOWN:
-            if square_index % 5 == 4:
-                row_str += '|'
-            elif row_index % 5 == 4:
-                row_str += '_'
-            else:
-                row_str += square.get_grid_char()
-        else:
-            row_str += square.get_grid_char()
+    return ''.join([get_square_char(square, row_index, square_index) for square_index, square in enumerate(row_squares)])
+
 
-    return row_str
+# Unknown squares show guide lines every 5 squares, to make counting easier
+def get_square_char(square: Square, row_index: int, column_index: int) -> str:
+    if square == Square.UNKNOWN:
+        if column_index % 5 == 4:
+            return '|'
+        elif row_index % 5 == 4:
+            return '_'
+    return square.get_grid_char()
 
 
 def get_row_header(row_index: int) -> str:
@@ -30,7 +31,7 @@ def get_row_header(row_index: int) -> str:
 
 
 def get_column_headers(puzzle: Puzzle) -> str:
-    column_count = len(puzzle._row_squares[0])
+    column_count = puzzle.num_columns
     max_digit_count = math.ceil(math.log10(column_count))
     header_digit_strs = ['   '] * max_digit_count
 
@@ -41,3 +42,159 @@ def get_column_headers(puzzle: Puzzle) -> str:
 
     header_str = '\n'.join(header_digit_strs)
     return header_str + '\n' + '   ' + '_' * column_count + '\n'
+
+
+# Draws a puzzle being solved live, in a terminal that understands ANSI escape codes
+# Works like the pygame visualiser: visualise_puzzle can be passed to the solver as on_change. It only draws a frame every 1 / max_fps seconds,
+# and then only rewrites the squares that changed since the last frame, by moving the cursor straight to them
+# Grids bigger than the terminal are shown through a viewport. With follow set, the viewport jumps to wherever the solver is working.
+# Call flush when solving is done, to draw the final state and leave the cursor below the grid.
+class TerminalPuzzleRenderer:
+    output: TextIO
+    frame_interval: float
+    follow: bool
+    viewport_height: int
+    viewport_width: int
+    top_row: int
+    left_column: int
+
+
+    def __init__(self, puzzle: Puzzle, output: TextIO = sys.stdout, max_fps: float = 30, viewport_size: tuple[int, int] | None = None, follow: bool = True) -> None:
+        self.output = output
+        self.frame_interval = 1 / max_fps
+        self.follow = follow
+        self.top_row = 0
+        self.left_column = 0
+
+        self._num_rows = puzzle.num_rows
+        self._num_columns = puzzle.num_columns
+        self._row_header_width = len(str(puzzle.num_rows - 1)) + 1
+        self._column_digit_count = len(str(puzzle.num_columns - 1))
+        header_height = self._column_digit_count + 1
+
+        if viewport_size is None:
+            terminal_size = shutil.get_terminal_size()
+            viewport_size = (terminal_size.lines - header_height - 1, terminal_size.columns - self._row_header_width)
+        self.viewport_height = max(1, min(viewport_size[0], puzzle.num_rows))
+        self.viewport_width = max(1, min(viewport_size[1], puzzle.num_columns))
+
+        # What's on screen, as row masks. None until the first frame, which draws everything.
+        self._shown_row_masks: list[tuple[int, int]] | None = None
+        self._last_frame_time = -math.inf
+
+
+    def visualise_puzzle(self, puzzle: Puzzle) -> None:
+        if time.perf_counter() - self._last_frame_time >= self.frame_interval:
+            self._draw_frame(puzzle)
+
+
+    def flush(self, puzzle: Puzzle) -> None:
+        self._draw_frame(puzzle)
+        grid_bottom_line = self._column_digit_count + 1 + self.viewport_height
+        self.output.write(f'\x1b[{grid_bottom_line + 1};1H\x1b[?25h')
+        self.output.flush()
+
+
+    def scroll_to(self, top_row: int, left_column: int) -> None:
+        self.top_row = max(0, min(top_row, self._num_rows - self.viewport_height))
+        self.left_column = max(0, min(left_column, self._num_columns - self.viewport_width))
+        self._shown_row_masks = None # Everything on screen has moved, so the next frame draws it all again
+
+
+    def scroll_by(self, rows: int, columns: int) -> None:
+        self.scroll_to(self.top_row + rows, self.left_column + columns)
+
+
+    def _draw_frame(self, puzzle: Puzzle) -> None:
+        self._last_frame_time = time.perf_counter()
+        row_masks = [puzzle.get_row_masks(row_index) for row_index in range(self._num_rows)]
+        frame_parts: list[str] = []
+
+        if self._shown_row_masks is not None:
+            changed_row_indices = [row_index for row_index in range(self._num_rows) if row_masks[row_index] != self._shown_row_masks[row_index]]
+            if self.follow and len(changed_row_indices) > 0 and not self._any_changes_in_view(changed_row_indices, row_masks):
+                self._follow_change(changed_row_indices[0], row_masks)
+
+        if self._shown_row_masks is None:
+            frame_parts.append(self._get_full_frame(row_masks))
+        else:
+            for row_index in changed_row_indices:
+                if self.top_row <= row_index < self.top_row + self.viewport_height:
+                    frame_parts.append(self._get_changed_squares(row_index, row_masks[row_index], self._shown_row_masks[row_index]))
+
+        self._shown_row_masks = row_masks
+        if len(frame_parts) > 0:
+            self.output.write(''.join(frame_parts))
+            self.output.flush()
+
+
+    def _get_viewport_mask(self) -> int:
+        return ((1 << self.viewport_width) - 1) << self.left_column
+
+
+    def _any_changes_in_view(self, changed_row_indices: list[int], row_masks: list[tuple[int, int]]) -> bool:
+        assert self._shown_row_masks is not None
+        viewport_mask = self._get_viewport_mask()
+        for row_index in changed_row_indices:
+            if self.top_row <= row_index < self.top_row + self.viewport_height:
+                filled_mask, blank_mask = row_masks[row_index]
+                shown_filled_mask, shown_blank_mask = self._shown_row_masks[row_index]
+                if ((filled_mask ^ shown_filled_mask) | (blank_mask ^ shown_blank_mask)) & viewport_mask:
+                    return True
+        return False
+
+
+    def _follow_change(self, row_index: int, row_masks: list[tuple[int, int]]) -> None:
+        assert self._shown_row_masks is not None
+        filled_mask, blank_mask = row_masks[row_index]
+        shown_filled_mask, shown_blank_mask = self._shown_row_masks[row_index]
+        changed_mask = (filled_mask ^ shown_filled_mask) | (blank_mask ^ shown_blank_mask)
+        column_index = (changed_mask & -changed_mask).bit_length() - 1
+        # Put the change in the middle of the viewport, or as near as the edges of the grid allow
+        self.scroll_to(row_index - self.viewport_height // 2, column_index - self.viewport_width // 2)
+
+
+    def _get_full_frame(self, row_masks: list[tuple[int, int]]) -> str:
+        frame_parts = ['\x1b[?25l\x1b[2J\x1b[H'] # Hide the cursor, clear the screen, and start at the top left
+
+        column_labels = [str(column_index).rjust(self._column_digit_count) for column_index in range(self.left_column, self.left_column + self.viewport_width)]
+        for digit_index in range(self._column_digit_count):
+            frame_parts.append(' ' * self._row_header_width + ''.join([column_label[digit_index] for column_label in column_labels]) + '\x1b[K\n')
+        frame_parts.append(' ' * self._row_header_width + '_' * self.viewport_width + '\x1b[K\n')
+
+        for row_index in range(self.top_row, self.top_row + self.viewport_height):
+            row_header = str(row_index).rjust(self._row_header_width - 1) + '|'
+            frame_parts.append(row_header + self._get_squares_string(row_index, row_masks[row_index], self.left_column, self.left_column + self.viewport_width) + '\x1b[K\n')
+
+        return ''.join(frame_parts)
+
+
+    # Moves the cursor to each run of changed squares in view, and writes them out
+    def _get_changed_squares(self, row_index: int, row_masks: tuple[int, int], shown_row_masks: tuple[int, int]) -> str:
+        changed_mask = ((row_masks[0] ^ shown_row_masks[0]) | (row_masks[1] ^ shown_row_masks[1])) & self._get_viewport_mask()
+        line_number = self._column_digit_count + 2 + row_index - self.top_row # Escape codes count from 1, and the header is above us
+        change_parts: list[str] = []
+
+        while changed_mask:
+            run_start = (changed_mask & -changed_mask).bit_length() - 1
+            # Adding the lowest set bit carries through the whole run of set bits above it, which finds where the run ends
+            run_end = ((changed_mask + (1 << run_start)) & -(changed_mask + (1 << run_start))).bit_length() - 1
+            column_number = self._row_header_width + 1 + run_start - self.left_column
+            change_parts.append(f'\x1b[{line_number};{column_number}H' + self._get_squares_string(row_index, row_masks, run_start, run_end))
+            changed_mask &= ~((1 << run_end) - 1)
+
+        return ''.join(change_parts)
+
+
+    def _get_squares_string(self, row_index: int, row_masks: tuple[int, int], start: int, end: int) -> str:
+        filled_mask, blank_mask = row_masks
+        square_chars: list[str] = []
+        for column_index in range(start, end):
+            if filled_mask >> column_index & 1:
+                square = Square.FILLED
+            elif blank_mask >> column_index & 1:
+                square = Square.KNOWN_BLANK
+            else:
+                square = Square.UNKNOWN
+            square_chars.append(get_square_char(square, row_index, column_index))
+        return ''.join(square_chars)